@@ -1,20 +1,30 @@
 import os
+import logging
 import time
 import sqlite3
-from datetime import datetime, timedelta
+import threading
+import urllib.error
+import urllib.request
+from datetime import datetime, timedelta, timezone
 from functools import wraps
 from flask import (
     Flask, render_template, request, redirect,
     url_for, session, flash, jsonify, Response,
-    make_response, send_file
+    make_response
 )
 import jwt  # PyJWT
-from collections import deque
-from crowd_detect import detect_crowd
-from video_analysis import stream_video_with_data, stop_stream, get_unique_count, generate_live_frames
-import visualization
-import numpy as np
-import cv2
+# cv2, matplotlib/pandas (visualization) and the detection modules are imported by the routes that use
+# them, so the server starts listening without paying for them; the model loads in the background
+import model_registry
+import detector_backends
+import broadcast
+import sessions
+import scheduler
+import count_store
+import export
+import app_logging
+import metrics
+import pipeline
 
 app = Flask(__name__)
 app.secret_key = "your-secret-key"
@@ -22,6 +32,7 @@ app.secret_key = "your-secret-key"
 JWT_SECRET_KEY = "your-jwt-secret-key"
 JWT_ALGORITHM = "HS256"
 JWT_EXP_DELTA_SECONDS = 3600
+METRICS_TOKEN = os.environ.get('CROWD_METRICS_TOKEN')
 
 UPLOAD_FOLDER = 'static/uploads'
 OUTPUT_FOLDER = 'static/outputs'
@@ -31,11 +42,6 @@ app.config['MAX_CONTENT_LENGTH'] = 500 * 1024 * 1024    #max:500mb
 os.makedirs(UPLOAD_FOLDER, exist_ok=True)
 os.makedirs(OUTPUT_FOLDER, exist_ok=True)
 
-ZONE_HISTORY = {'Zone 1': [], 'Zone 2': []}
-RECENT_POINTS_ZONE1 = deque(maxlen=1000)
-RECENT_POINTS_ZONE2 = deque(maxlen=1000)
-ZONE_TIMESTAMPS = []
-
 # Initialize DB with STUDENT table and default user
 def init_db():
     connection = sqlite3.connect('LoginData.db')
@@ -54,6 +60,22 @@ def init_db():
     connection.close()
 
 init_db()
+app_logging.setup()
+log = app_logging.get_logger('app')
+frame_log = app_logging.Sampler(app_logging.get_logger('stream'))
+
+# The detector is loaded and warmed up in the background once the server is serving requests: the
+# first request (or the /ready probe) starts it, so startup itself never waits for torch/weights
+PRELOAD_MODEL = os.environ.get('CROWD_PRELOAD_MODEL', '1') != '0'
+_preload_started = False
+
+
+@app.before_request
+def start_model_preload():
+    global _preload_started
+    if PRELOAD_MODEL and not _preload_started:
+        _preload_started = True
+        model_registry.preload()
 
 
 # JWT token creation
@@ -93,13 +115,13 @@ def token_required(f):
 def login():
     email = request.form['email']
     password = request.form['password']
-    print(f"Login attempt with email={email}, password={password}")  # Debug
+    app_logging.event(log, logging.DEBUG, "login attempt", email=email)
     conn = sqlite3.connect('LoginData.db')
     cursor = conn.cursor()
     cursor.execute("SELECT first_name, email, role FROM STUDENT WHERE email=? AND password=?", (email, password))
     user = cursor.fetchone()
 
-    print(f"User found: {user}")  # Debug
+    app_logging.event(log, logging.INFO, "login", email=email, success=user is not None)
     conn.close()
     if user:
         token = create_jwt_token(user[0])
@@ -183,44 +205,277 @@ def dashboard():
 
 
 
-def update_heatmap_image(points_zone1, points_zone2):
-    visualization.save_heatmap_image(points_zone1, points_zone2)
+def request_backend():
+    # Optional ?backend=torch|onnx|openvino|int8|stub picks the detector for this stream; False if unknown
+    backend = request.args.get("backend")
+    if backend and backend not in detector_backends.BACKENDS:
+        return False
+    return backend
+
+
+def multipart_frames(frames):
+    # Encode the multipart chunk once per frame; every viewer of a broadcast gets the same bytes
+    for frame_bytes, data in frames:
+        yield (b'--frame\r\nContent-Type: image/jpeg\r\n\r\n' + frame_bytes + b'\r\n'), data
+
+
+def log_zone_counts(tag, source):
+    # Runs once per produced frame (not once per viewer), sampled to one event per stream per
+    # FRAME_LOG_INTERVAL; the counts themselves are kept in the stream session
+    def on_item(item):
+        _, data = item
+        frame_log((tag, source), "zone counts", stream=tag, source=source, zones=data.get('zone_counts', {}),
+                  latency_ms=data.get('latency_ms'))
+    return on_item
+
+
+def broadcast_response(key, source, frames_factory, tag):
+    # All viewers of the same source share one capture/inference/encode loop
+    username = session.get('username')
+    stream = broadcast.watch(key, lambda: multipart_frames(frames_factory()), log_zone_counts(tag, source),
+                             viewer=username, source=source)
+    def generate():
+        try:
+            for i, (chunk, _) in enumerate(stream):
+                if i == 0:
+                    # Everyone watching a stream may read its history; other users' streams stay private
+                    for running in sessions.get_manager().running(source):
+                        running.viewers.add(username)
+                yield chunk
+        finally:
+            stream.close()
+    return Response(generate(), mimetype='multipart/x-mixed-replace; boundary=frame')
+
+
+def viewer_session(source=None):
+    # The current user's most recent stream session for ?source= (video path or 'webcam'), if any
+    return sessions.get_manager().latest(source or None, viewer=session.get('username'))
 
 
 @app.route('/video_analysis_stream')
 @token_required
 def video_analysis_stream():
+    from video_analysis import stream_video_with_data
     video_path = request.args.get("video_path")
     if not video_path or not os.path.exists(video_path):
         return "No video uploaded or invalid path.", 400
-    def generate():
-        for frame_bytes, data in stream_video_with_data(video_path):
-            centers_zone1 = data.get('centers_zone1', [])
-            centers_zone2 = data.get('centers_zone2', [])
-            zone_counts = data.get('zone_counts', {})
-            zone1_count = zone_counts.get('Zone 1', 0)
-            zone2_count = zone_counts.get('Zone 2', 0)
-            print(f"[VIDEO] Appending Zone Counts: Zone1: {zone1_count}, Zone2: {zone2_count}")
-            ZONE_HISTORY['Zone 1'].append(zone1_count)
-            ZONE_HISTORY['Zone 2'].append(zone2_count)
-            ZONE_TIMESTAMPS.append(datetime.utcnow().isoformat())
-            print(f"[VIDEO] Total ZONE_HISTORY Zone 1: {ZONE_HISTORY['Zone 1']}")
-            print(f"[VIDEO] Total ZONE_HISTORY Zone 2: {ZONE_HISTORY['Zone 2']}")
-            update_heatmap_image(centers_zone1, centers_zone2)
-            yield (b'--frame\r\nContent-Type: image/jpeg\r\n\r\n' + frame_bytes + b'\r\n')
-    return Response(generate(), mimetype='multipart/x-mixed-replace; boundary=frame')
+    backend = request_backend()
+    if backend is False:
+        return "Unknown detector backend.", 400
+    return broadcast_response(('video', video_path, backend), video_path,
+                              lambda: stream_video_with_data(video_path, backend=backend), "VIDEO")
+
+@app.route('/broadcast_stats')
+@token_required
+def broadcast_stats():
+    return jsonify(broadcast.stats())
+
+@app.route('/stream_sessions')
+@token_required
+def stream_sessions():
+    # Admins see every stream; other users only the streams they have watched (as /zone_counts_history)
+    viewer = None if session.get('role') == 'admin' else session.get('username')
+    return jsonify(sessions.get_manager().stats(viewer))
+
+@app.route('/scheduler_stats')
+@token_required
+def scheduler_stats():
+    # Batch-size and queueing-delay histograms of the cross-stream inference scheduler
+    return jsonify(scheduler.stats())
+
+def runtime_metrics():
+    # Gauges and counters read from the components' own stats at scrape time (nothing extra per frame)
+    running = [s for s in sessions.get_manager().stats() if not s['finished']]
+    label = lambda source: os.path.basename(str(source)) or str(source)
+    yield ('crowd_stream_fps', 'gauge', 'Moving-average processed frames per second of each running stream',
+           [({'source': label(s['source']), 'session': s['id'][:8]}, s['fps']) for s in running])
+    yield ('crowd_stream_frames', 'gauge', 'Frames processed by each running stream so far',
+           [({'source': label(s['source']), 'session': s['id'][:8]}, s['frames']) for s in running])
+    yield ('crowd_streams_running', 'gauge', 'Running stream sessions', [({}, len(running))])
+    dropped = [({'stage': 'capture', 'source': label(s['source']), 'session': s['id'][:8]}, s['dropped_frames'])
+               for s in running]
+    dropped += [({'stage': 'pipeline', 'source': p['name']}, p['dropped']) for p in pipeline.stats()]
+    dropped += [({'stage': 'broadcast', 'source': label(b['source'])}, b['dropped']) for b in broadcast.stats()]
+    yield ('crowd_frames_dropped', 'gauge', 'Frames skipped to stay real time, per running stream', dropped)
+    depths = [({'queue': f'pipeline{i}', 'source': p['name']}, depth)
+              for p in pipeline.stats() for i, depth in enumerate(p['depths'])]
+    depths += [({'queue': 'scheduler', 'source': s['backend']}, s['pending']) for s in scheduler.stats()]
+    store = count_store.stats()         # None until the first stream opened the store
+    if store is not None:
+        depths.append(({'queue': 'count_store'}, store['pending']))
+    yield ('crowd_queue_depth', 'gauge', 'Items waiting in each internal queue', depths)
+    yield ('crowd_scheduler_mean_batch_size', 'gauge', 'Mean frames per forward pass',
+           [({'backend': s['backend']}, s['mean_batch_size']) for s in scheduler.stats()])
+    pools = model_registry.pool_stats()
+    yield ('crowd_model_replicas', 'gauge', 'Loaded detector replicas per backend',
+           [({'backend': name}, p['replicas']) for name, p in pools.items()])
+    yield ('crowd_model_replicas_idle', 'gauge', 'Detector replicas not leased right now',
+           [({'backend': name}, p['idle']) for name, p in pools.items()])
+    if store is not None:
+        yield ('crowd_count_store_written_total', 'counter', 'Zone-count samples written to SQLite', [({}, store['written'])])
+        yield ('crowd_count_store_dropped_total', 'counter', 'Zone-count samples dropped on a full writer queue',
+               [({}, store['dropped'])])
+    yield ('crowd_log_records_dropped_total', 'counter', 'Log records dropped on a full log queue',
+           [({}, app_logging.dropped())])
+
+metrics.register_collector(runtime_metrics)
+
+@app.route('/ready')
+def ready():
+    # Readiness probe: 200 once the default detector is loaded and warm, 503 while loading or after a failure
+    status = model_registry.status()
+    return jsonify(status), 200 if status['ready'] else 503
+
+@app.route('/metrics')
+def prometheus_metrics():
+    # Prometheus text format; open to scrapers unless CROWD_METRICS_TOKEN is set, then a bearer token is required
+    if METRICS_TOKEN and request.headers.get('Authorization') != f'Bearer {METRICS_TOKEN}':
+        return "Unauthorized", 401
+    return Response(metrics.render(), mimetype='text/plain; version=0.0.4')
+
+@app.route('/heatmap')
+@token_required
+def heatmap():
+    import zones
+    # Density heatmap of a stream's session (?source=<video path>|webcam, default: most recent stream),
+    # rendered on request from the session's accumulated grid
+    stream_session = viewer_session(request.args.get("source"))
+    if stream_session is None or stream_session.heatmap is None:
+        return "No stream has been analysed yet.", 404
+    png = stream_session.heatmap.render_png(zones.get_layout(stream_session.source))
+    response = make_response(png)
+    response.headers['Content-Type'] = 'image/png'
+    response.headers['Cache-Control'] = 'no-store'
+    return response
 
 @app.route('/zone_population_charts')
 @token_required
 def zone_population_charts():
-    bar_chart_img, line_chart_img = visualization.create_population_charts(ZONE_HISTORY, ZONE_TIMESTAMPS)
+    import visualization
+    stream_session = viewer_session(request.args.get("source"))
+    if stream_session is None or not stream_session.history.names:
+        return jsonify({"error": "No zone counts recorded yet."}), 404
+    bar_chart_img, line_chart_img = visualization.create_population_charts(*stream_session.history.as_history())
     return jsonify({'bar_chart': bar_chart_img, 'line_chart': line_chart_img})
 
+@app.route('/zone_rollup')
+@token_required
+def zone_rollup():
+    # Per-second or per-minute mean/max zone counts of the user's stream (?source=, ?resolution=second|minute)
+    stream_session = viewer_session(request.args.get("source"))
+    if stream_session is None:
+        return jsonify({"error": "No zone counts recorded yet."}), 404
+    resolution = request.args.get("resolution", "minute")
+    if resolution not in ('second', 'minute'):
+        return jsonify({"error": "resolution must be 'second' or 'minute'."}), 400
+    return jsonify(stream_session.history.rollup(resolution))
+
+@app.route('/video_log_charts')
+@token_required
+def video_log_charts():
+    import visualization
+    import zones
+    from video_analysis import get_track_log
+    # Charts and heatmap for an already analysed video, read from its track log (no inference)
+    video_path = request.args.get("video_path")
+    log = get_track_log(video_path) if video_path and os.path.exists(video_path) else None
+    if log is None:
+        return jsonify({"error": "Video has not been fully analysed yet."}), 404
+    layout = zones.get_layout(video_path).for_size(*log.size)
+    history = log.zone_series(layout)
+    bar_chart_img, line_chart_img = visualization.create_population_charts(history, log.timestamps())
+    heatmap_img = visualization.create_heatmap_image(*log.centers(layout))
+    return jsonify({'bar_chart': bar_chart_img, 'line_chart': line_chart_img, 'heatmap': 'data:image/png;base64,' + heatmap_img,
+                    'count': log.unique_count()})
+
+@app.route('/video_log_csv')
+@token_required
+def video_log_csv():
+    import visualization
+    import zones
+    from video_analysis import get_track_log
+    video_path = request.args.get("video_path")
+    log = get_track_log(video_path) if video_path and os.path.exists(video_path) else None
+    if log is None:
+        return "Video has not been fully analysed yet.", 404
+    layout = zones.get_layout(video_path).for_size(*log.size)
+    # Built in memory: concurrent requests for the same video never share a file on disk
+    body = visualization.zone_counts_csv(log.zone_series(layout), log.timestamps())
+    return Response(body, mimetype='text/csv', headers={'Content-Disposition': 'attachment; filename=zone_counts.csv'})
+
+def parse_time_ms(value, default):
+    # Epoch milliseconds or an ISO-8601 timestamp (UTC)
+    if not value:
+        return default
+    if value.isdigit():
+        return int(value)
+    parsed = datetime.fromisoformat(value)
+    if parsed.tzinfo is None:
+        parsed = parsed.replace(tzinfo=timezone.utc)
+    return int(parsed.timestamp() * 1000)
+
+@app.route('/zone_counts_history')
+@token_required
+def zone_counts_history():
+    # Durable counts for ?source= over [start, end) in ?bucket= second buckets (default: last hour, per minute).
+    # Admins may read any source; other users only sources they have watched since the server started.
+    source = request.args.get("source", "webcam")
+    if session.get('role') != 'admin' and viewer_session(source) is None:
+        return jsonify({"error": "Unknown source."}), 404
+    now = int(time.time() * 1000)
+    try:
+        end = parse_time_ms(request.args.get("end"), now)
+        start = parse_time_ms(request.args.get("start"), end - 3600 * 1000)
+        bucket = float(request.args.get("bucket", 60))
+    except ValueError:
+        return jsonify({"error": "start/end must be epoch ms or ISO-8601; bucket must be seconds."}), 400
+    if bucket <= 0:
+        return jsonify({"error": "bucket must be positive."}), 400
+    zone_names = request.args.getlist("zone") or None
+    return jsonify(count_store.get_store().query(source, start, end, bucket, zone_names))
+
 @app.route('/download_zone_counts_csv')
 @token_required
 def download_zone_counts_csv():
-    _, csv_path = visualization.create_zone_barchart_and_csv(ZONE_HISTORY, ZONE_TIMESTAMPS)
-    return send_file(csv_path, mimetype='text/csv', as_attachment=True, download_name='zone_counts.csv')
+    # Streams zone counts from the durable store: ?source=, ?start=/?end= (epoch ms or ISO, default: the
+    # user's latest session of that source until now), ?bucket= seconds (default: every frame) and
+    # ?format=csv|csv.gz|parquet. Rows are generated in chunks, so long ranges use constant memory.
+    source = request.args.get("source", "webcam")
+    stream_session = viewer_session(source)
+    if session.get('role') != 'admin' and stream_session is None:
+        flash("No zone counts recorded yet.")
+        return redirect(request.referrer or url_for('dashboard'))
+    fmt = request.args.get("format", "csv.gz" if request.args.get("gzip") == "1" else "csv")
+    if fmt not in export.EXPORT_FORMATS:
+        return jsonify({"error": f"format must be one of {', '.join(export.EXPORT_FORMATS)}."}), 400
+    if fmt == 'parquet' and not export.have_parquet():
+        return jsonify({"error": "Parquet export needs pyarrow installed."}), 501
+    first_ts = stream_session.history.first_ts if stream_session is not None else None
+    # A batch job's samples are stamped with media time from submission and may lie ahead of now
+    last_ts = stream_session.history.last_ts if stream_session is not None else None
+    try:
+        end = parse_time_ms(request.args.get("end"), max(int(time.time() * 1000), last_ts or 0) + 1)
+        start = parse_time_ms(request.args.get("start"), first_ts or 0)
+        bucket = float(request.args.get("bucket", 0))
+    except ValueError:
+        return jsonify({"error": "start/end must be epoch ms or ISO-8601; bucket must be seconds."}), 400
+
+    import zones
+    store = count_store.get_store()
+    # Columns follow the camera's layout order (polygons, then outside); zones only in older data go last
+    stored = store.zones(source)
+    layout_order = [name for _, name in zones.get_layout(source).display_order()]
+    zone_names = request.args.getlist("zone") or ([name for name in layout_order if name in stored] +
+                                                  [name for name in stored if name not in layout_order])
+    header = export.columns(zone_names, bool(bucket))
+    rows = export.wide_rows(store.iter_rows(source, start, end, bucket or None, zone_names), zone_names, bool(bucket))
+    if fmt == 'parquet':
+        body, mimetype, name = export.parquet_chunks(rows, header), 'application/vnd.apache.parquet', 'zone_counts.parquet'
+    else:
+        body, mimetype, name = export.csv_chunks(rows, header, compress=fmt == 'csv.gz'), 'text/csv', 'zone_counts.' + fmt
+    response = Response(body, mimetype='application/gzip' if fmt == 'csv.gz' else mimetype)
+    response.headers['Content-Disposition'] = f'attachment; filename={name}'
+    return response
 
 @app.errorhandler(413)
 def request_entity_too_large(error):
@@ -245,6 +500,7 @@ def image_analysis():
     output_url = None
     count = None
     stored_filename = None
+    tiled = False
     if request.method == 'POST':
         if 'view_image' in request.form:
             file = request.files.get('image')
@@ -261,12 +517,14 @@ def image_analysis():
             if stored_filename:
                 image_path = os.path.join(app.config['UPLOAD_FOLDER'], stored_filename)
                 output_path = os.path.join(app.config['OUTPUT_FOLDER'], stored_filename)
-                count, _ = detect_crowd(image_path, output_path)
+                tiled = request.form.get('tiled') == '1'
+                from crowd_detect import detect_crowd
+                count, _ = detect_crowd(image_path, output_path, tiled=tiled)
                 output_url = 'outputs/' + stored_filename
                 image_url = 'uploads/' + stored_filename
     else:
         stored_filename = session.get('stored_filename')
-    return render_template('image_analysis.html', username=session.get('username'), image_url=image_url, output_url=output_url, count=count, stored_filename=stored_filename, active_page='image')
+    return render_template('image_analysis.html', username=session.get('username'), image_url=image_url, output_url=output_url, count=count, stored_filename=stored_filename, tiled=tiled, active_page='image')
 
 @app.route('/video-analysis', methods=['GET', 'POST'])
 @token_required
@@ -299,27 +557,91 @@ def logout():
 @app.route('/get_video_count')
 @token_required
 def get_video_count():
+    from video_analysis import get_unique_count
     video_path = request.args.get("video_path")
     count = get_unique_count(video_path)
     return jsonify({"count": count})
 
+@app.route('/video_analysis_batch', methods=['POST'])
+@token_required
+def video_analysis_batch():
+    import batch_analysis
+    # Offline job mode: analyses the whole upload across worker processes instead of streaming it
+    video_path = request.form.get("video_path") or request.args.get("video_path")
+    if not video_path or not os.path.exists(video_path):
+        return jsonify({"error": "No video uploaded or invalid path."}), 400
+    job_id = batch_analysis.submit_job(video_path)
+    return jsonify({"job_id": job_id})
+
+@app.route('/video_analysis_job')
+@token_required
+def video_analysis_job():
+    import batch_analysis
+    job = batch_analysis.get_job(request.args.get("job_id"))
+    if job is None:
+        return jsonify({"error": "Unknown job."}), 404
+    response = {"status": job['status'], "progress": job['progress']}
+    if job['status'] == 'done':
+        result = job['result']
+        if batch_analysis.claim(job, 'charted'):
+            # Record the zone series as a finished session of this user, stamped with media time (PTS)
+            # from the job start, so the chart/CSV routes serve it like a streamed video. Claimed under
+            # the jobs lock: two concurrent polls must not both write the series to the count store.
+            started_ms = int(job['submitted'].replace(tzinfo=timezone.utc).timestamp() * 1000)
+            record = sessions.get_manager().open(job['video_path'])
+            record.viewers.add(session.get('username'))
+            timestamps = [started_ms + int(pts * 1000) for pts in result['pts']]
+            record.history.extend(result['zone_counts'], timestamps)
+            record.close()
+            # The CSV/Parquet export reads the durable store, so the job's series goes there too
+            count_store.get_store().extend(job['video_path'], result['zone_counts'], timestamps)
+        response.update({"frames": result['frames'], "count": result['unique_count'], "zone_counts": result['zone_counts']})
+    elif job['status'] == 'failed':
+        response["error"] = job.get('error')
+    return jsonify(response)
+
+@app.route('/zones', methods=['GET', 'POST'])
+@token_required
+def zone_layout():
+    import zones
+    # GET the active layout for ?video_path=<path or 'webcam'>; POST a new one (JSON) to hot-reload it
+    source = request.args.get("video_path", "webcam")
+    if request.method == 'POST':
+        try:
+            path = zones.save_layout(source, request.get_json(force=True))
+        except ValueError as e:
+            return jsonify({"error": str(e)}), 400
+        return jsonify({"saved": path})
+    return jsonify(zones.get_layout(source).spec)
+
+@app.route('/motion_gate_stats')
+@token_required
+def motion_gate_stats():
+    from video_analysis import get_motion_gate_stats
+    source = request.args.get("video_path", "webcam")
+    return jsonify(get_motion_gate_stats(source))
+
 @app.route('/stop_video')
 @token_required
 def stop_video():
+    # Stops this user's view only; a stream other users still watch keeps running, and one nobody
+    # watches anymore is shut down by its broadcaster after IDLE_LINGER
+    from video_analysis import get_unique_count
     video_path = request.args.get("video_path")
     if video_path:
-        stop_stream(video_path)
+        broadcast.leave(session.get('username'), video_path)
     count = get_unique_count(video_path)
     return jsonify({"count": count})
 
 @app.route('/generate_charts', methods=['POST'])
 @token_required
 def generate_charts():
-    print(f"[CHART] Zone 1 History Before Chart: {ZONE_HISTORY['Zone 1']}")
-    print(f"[CHART] Zone 2 History Before Chart: {ZONE_HISTORY['Zone 2']}")
-    bar_chart_img, line_chart_img = visualization.create_population_charts(ZONE_HISTORY, ZONE_TIMESTAMPS)
-    heatmap_path = "static/heatmap.png"
-    heatmap_url = "heatmap.png" if os.path.exists(heatmap_path) else None
+    import visualization
+    stream_session = viewer_session()
+    bar_chart_img = line_chart_img = heatmap_url = None
+    if stream_session is not None and stream_session.history.names:
+        bar_chart_img, line_chart_img = visualization.create_population_charts(*stream_session.history.as_history())
+        heatmap_url = url_for('heatmap', source=stream_session.source)
     return render_template('image_analysis.html', username=session.get('username'), image_url=session.get('stored_filename'), stored_filename=session.get('stored_filename'), bar_chart_img=bar_chart_img, line_chart_img=line_chart_img, heatmap_url=heatmap_url, active_page='image')
 
 
@@ -332,28 +654,44 @@ def webcam_feed_page():
 @app.route('/webcam_feed')
 @token_required
 def webcam_feed():
-    # Simple raw webcam stream with video frames only (no zone counts)
-    return Response(generate_live_frames(), mimetype='multipart/x-mixed-replace; boundary=frame')
+    from video_analysis import generate_live_frames
+    # Raw webcam view; shares the same producer as /webcam_stream
+    backend = request_backend()
+    if backend is False:
+        return "Unknown detector backend.", 400
+    return broadcast_response(('webcam', backend), "webcam", lambda: generate_live_frames(backend=backend), "WEBCAM")
+
+@app.route('/webcam_latency')
+@token_required
+def webcam_latency():
+    from video_analysis import get_latency_stats
+    # Capture-to-encoded-frame latency of the live stream (last, p50, p95, max in ms)
+    return jsonify(get_latency_stats("webcam"))
 
 @app.route('/webcam_stream')
 @token_required
 def webcam_stream():
+    from video_analysis import generate_live_frames
     # Webcam stream with detection data yielding frames + zone counts for charting
-    def generate():
-        for frame_bytes, data in generate_live_frames():
-            centers_zone1 = data.get('centers_zone1', [])
-            centers_zone2 = data.get('centers_zone2', [])
-            zone_counts = data.get('zone_counts', {})
-            zone1_count = zone_counts.get('Zone 1', 0)
-            zone2_count = zone_counts.get('Zone 2', 0)
-            print(f"[WEBCAM] Appending Zone Counts: Zone1: {zone1_count}, Zone2: {zone2_count}")
-            ZONE_HISTORY['Zone 1'].append(zone1_count)
-            ZONE_HISTORY['Zone 2'].append(zone2_count)
-            ZONE_TIMESTAMPS.append(datetime.utcnow().isoformat())
-            update_heatmap_image(centers_zone1, centers_zone2)
-            yield (b'--frame\r\nContent-Type: image/jpeg\r\n\r\n' + frame_bytes + b'\r\n')
-    return Response(generate(), mimetype='multipart/x-mixed-replace; boundary=frame')
+    backend = request_backend()
+    if backend is False:
+        return "Unknown detector backend.", 400
+    return broadcast_response(('webcam', backend), "webcam", lambda: generate_live_frames(backend=backend), "WEBCAM")
+
+
+def _ping_when_listening(port):
+    # Hits /ready as soon as the server accepts connections, so the serving process (the reloader's
+    # child in debug mode) starts the model preload without waiting for a user
+    for _ in range(600):
+        try:
+            urllib.request.urlopen(f'http://127.0.0.1:{port}/ready', timeout=1).close()
+            return
+        except urllib.error.HTTPError:
+            return          # 503 while loading: the preload has started
+        except OSError:
+            time.sleep(0.1)
 
 
 if __name__ == '__main__':
+    threading.Thread(target=_ping_when_listening, args=(5550,), name='preload-trigger', daemon=True).start()
     app.run(debug=True, port=5550)
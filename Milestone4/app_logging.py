@@ -0,0 +1,102 @@
+import json
+import logging
+import logging.handlers
+import os
+import queue
+import threading
+import time
+
+LOG_LEVEL = os.environ.get('CROWD_LOG_LEVEL', 'INFO').upper()
+# Per-frame events are emitted at most once per interval per stream; 0 switches them off entirely
+FRAME_LOG_INTERVAL = float(os.environ.get('CROWD_FRAME_LOG_INTERVAL', 5.0))
+LOG_QUEUE_SIZE = 10000
+
+_ROOT = 'crowd'
+_setup_lock = threading.Lock()
+_listener = None
+
+
+class JsonFormatter(logging.Formatter):
+    # One JSON object per line: time, level, logger, message and any structured fields
+    def format(self, record):
+        entry = {
+            'ts': time.strftime('%Y-%m-%dT%H:%M:%S', time.gmtime(record.created)) + f'.{int(record.msecs):03d}Z',
+            'level': record.levelname,
+            'logger': record.name,
+            'msg': record.getMessage(),
+        }
+        entry.update(getattr(record, 'fields', {}))
+        if record.exc_info:
+            entry['exc'] = self.formatException(record.exc_info)
+        return json.dumps(entry, default=str)
+
+
+class _DroppingQueueHandler(logging.handlers.QueueHandler):
+    # The caller only enqueues; a full queue drops the record instead of blocking a frame loop
+    dropped = 0
+
+    def enqueue(self, record):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            _DroppingQueueHandler.dropped += 1
+
+
+def setup(level=None, stream=None):
+    # Idempotent: 'crowd.*' loggers go through a bounded queue to a background thread that formats and writes
+    global _listener
+    with _setup_lock:
+        root = logging.getLogger(_ROOT)
+        root.setLevel(level or LOG_LEVEL)
+        if _listener is not None:
+            return root
+        output = logging.StreamHandler(stream)
+        output.setFormatter(JsonFormatter())
+        log_queue = queue.Queue(maxsize=LOG_QUEUE_SIZE)
+        root.addHandler(_DroppingQueueHandler(log_queue))
+        root.propagate = False
+        _listener = logging.handlers.QueueListener(log_queue, output, respect_handler_level=True)
+        _listener.start()
+        return root
+
+
+def dropped():
+    return _DroppingQueueHandler.dropped
+
+
+def get_logger(name):
+    return logging.getLogger(f'{_ROOT}.{name}')
+
+
+def event(logger, level, msg, **fields):
+    if logger.isEnabledFor(level):
+        logger.log(level, msg, extra={'fields': fields})
+
+
+class Sampler:
+    # Rate-limits a repeating event per key (e.g. one per stream) to once per `interval` seconds and
+    # reports how many were skipped in between. Cost per call is a dict lookup and a clock read.
+
+    def __init__(self, logger, interval=None, level=logging.INFO):
+        self.logger = logger
+        self.interval = FRAME_LOG_INTERVAL if interval is None else interval
+        self.level = level
+        self._last = {}
+        self._skipped = {}
+
+    def __call__(self, key, msg, **fields):
+        if self.interval <= 0 or not self.logger.isEnabledFor(self.level):
+            return
+        now = time.monotonic()
+        if len(self._last) > 1000 and key not in self._last:
+            self._last.clear()      # many short-lived keys: start over rather than grow
+            self._skipped.clear()
+        if now - self._last.get(key, float('-inf')) < self.interval:
+            self._skipped[key] = self._skipped.get(key, 0) + 1
+            return
+        self._last[key] = now
+        event(self.logger, self.level, msg, key=str(key), skipped=self._skipped.pop(key, 0), **fields)
+
+    def forget(self, key):
+        self._last.pop(key, None)
+        self._skipped.pop(key, None)
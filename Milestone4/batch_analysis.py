@@ -0,0 +1,196 @@
+import os
+import threading
+import time
+import uuid
+from datetime import datetime
+from concurrent.futures import ProcessPoolExecutor, as_completed
+import multiprocessing
+
+import cv2
+import numpy as np
+
+import detector_backends
+from box_ops import pairwise_overlap
+from model_registry import get_model
+import zones
+
+# Offline (non-streaming) analysis: the video is cut into segments that are tracked in parallel
+# worker processes, then the per-segment track ids are stitched into one global id space.
+BATCH_SEGMENT_SECONDS = 60
+BATCH_OVERLAP_FRAMES = 15       # frames each segment re-tracks from the previous one, used for stitching
+BATCH_MATCH_IOU = 0.5
+BATCH_WORKERS = max(1, (os.cpu_count() or 1) // 2)
+JOB_RETENTION = 3600.0          # seconds a finished job (and its per-frame series) stays pollable
+JOB_MAX_FINISHED = 16           # and at most this many finished jobs are kept per server
+
+_jobs = {}      # job id -> job dict, insertion (= submit) order
+_jobs_lock = threading.Lock()
+
+
+def _init_worker(torch_threads):
+    import model_registry
+    model_registry.set_torch_threads(torch_threads)   # N processes x all-core torch would oversubscribe the CPU
+
+
+def _reset_tracker(model):
+    # Only ultralytics models keep tracker state on a predictor (the stub and onnx backends have none)
+    for tracker in getattr(getattr(model, 'predictor', None), 'trackers', None) or []:
+        tracker.reset()
+
+
+def _process_segment(video_path, start, end, overlap, backend):
+    # Runs in a worker process: tracks frames [start - overlap, end) and returns per-frame records
+    model = get_model(backend)
+    _reset_tracker(model)
+    first = max(0, start - overlap)
+    cap = cv2.VideoCapture(video_path)
+    cap.set(cv2.CAP_PROP_POS_FRAMES, first)
+    records = []
+    try:
+        for index in range(first, end):
+            ret, frame = cap.read()
+            if not ret:
+                break
+            pts = cap.get(cv2.CAP_PROP_POS_MSEC) / 1000.0
+            frame = cv2.resize(frame, (1024, 576))
+            results = model.track(frame, persist=True, classes=[0], tracker="bytetrack.yaml", conf=0.25, verbose=False)
+            if results[0].boxes.id is not None:
+                ids = results[0].boxes.id.cpu().numpy().astype(int)
+                boxes = results[0].boxes.xyxy.cpu().numpy().astype(int)
+            else:
+                ids, boxes = np.zeros(0, dtype=int), np.zeros((0, 4), dtype=int)
+            records.append((index, pts, ids, boxes))
+    finally:
+        cap.release()
+    return start, records
+
+
+def _stitch(segments, match_iou=BATCH_MATCH_IOU):
+    # segments: list of (start, records) sorted by start. Returns (frames, global id count) where
+    # frames is [(index, pts, global_ids, boxes)] covering each frame exactly once.
+    frames = []
+    next_id = 0
+    prev_by_index = {}     # frame index -> (global ids, boxes) from the previous segment
+    for start, records in segments:
+        votes = {}
+        for index, _, ids, boxes in records:
+            prev = prev_by_index.get(index)
+            if prev is None or not len(ids) or not len(prev[0]):
+                continue
+            iou = pairwise_overlap(boxes, prev[1])
+            for i, j in zip(*np.nonzero(iou >= match_iou)):
+                key = (int(ids[i]), int(prev[0][j]))
+                votes[key] = votes.get(key, 0) + 1
+
+        mapping = {}
+        taken = set()
+        for (local, glob), _ in sorted(votes.items(), key=lambda kv: -kv[1]):
+            if local not in mapping and glob not in taken:
+                mapping[local] = glob
+                taken.add(glob)
+
+        prev_by_index = {}
+        for index, pts, ids, boxes in records:
+            if index < start:
+                continue    # overlap frames were only re-tracked to warm up the tracker and match ids
+            global_ids = np.empty(len(ids), dtype=int)
+            for k, local in enumerate(ids.tolist()):
+                if local not in mapping:
+                    mapping[local] = next_id
+                    next_id += 1
+                global_ids[k] = mapping[local]
+            prev_by_index[index] = (global_ids, boxes)
+            frames.append((index, pts, global_ids, boxes))
+    return frames, next_id
+
+
+def _zone_counts(frames, layout):
+    frame_of_box = np.repeat(np.arange(len(frames)), [len(boxes) for _, _, _, boxes in frames])
+    boxes = np.concatenate([boxes for _, _, _, boxes in frames]) if frames else np.zeros((0, 4), dtype=int)
+    return layout.series(frame_of_box, layout.assign(layout.centers(boxes)), len(frames))
+
+
+def analyse_video(video_path, workers=None, segment_seconds=None, progress=None, backend=None):
+    cap = cv2.VideoCapture(video_path)
+    total = int(cap.get(cv2.CAP_PROP_FRAME_COUNT))
+    fps = cap.get(cv2.CAP_PROP_FPS) or 25.0
+    cap.release()
+    if total <= 0:
+        raise ValueError(f"Unable to read frame count: {video_path}")
+
+    workers = workers or BATCH_WORKERS
+    segment = max(1, int(fps * (segment_seconds or BATCH_SEGMENT_SECONDS)))
+    bounds = [(s, min(s + segment, total)) for s in range(0, total, segment)]
+    torch_threads = max(1, (os.cpu_count() or 1) // workers)
+    backend = backend or detector_backends.DETECTOR_BACKEND     # spawned workers don't see runtime config changes
+
+    results = []
+    ctx = multiprocessing.get_context('spawn')
+    with ProcessPoolExecutor(max_workers=workers, mp_context=ctx, initializer=_init_worker,
+                             initargs=(torch_threads,)) as pool:
+        futures = [pool.submit(_process_segment, video_path, s, e, BATCH_OVERLAP_FRAMES, backend) for s, e in bounds]
+        for done, future in enumerate(as_completed(futures), 1):
+            results.append(future.result())
+            if progress is not None:
+                progress(done / len(futures))
+
+    frames, unique_count = _stitch(sorted(results, key=lambda r: r[0]))
+    return {
+        'frames': len(frames),
+        'fps': fps,
+        'pts': [pts for _, pts, _, _ in frames],
+        'zone_counts': _zone_counts(frames, zones.get_layout(video_path).for_size(1024, 576)),   # boxes are in resized-frame pixels
+        'unique_count': unique_count,
+    }
+
+
+def _run_job(job_id, video_path, workers):
+    job = _jobs[job_id]
+
+    def progress(fraction):
+        job['progress'] = round(fraction, 3)
+
+    try:
+        job['result'] = analyse_video(video_path, workers=workers, progress=progress)
+        job['status'] = 'done'
+    except Exception as e:
+        job['status'] = 'failed'
+        job['error'] = str(e)
+    job['finished_at'] = time.monotonic()
+
+
+def _prune_jobs():
+    # Caller holds _jobs_lock. Same policy as sessions.SessionManager.reap: expire finished jobs after
+    # JOB_RETENTION and keep at most JOB_MAX_FINISHED of them; running jobs are never dropped.
+    now = time.monotonic()
+    finished = [(job_id, job) for job_id, job in _jobs.items() if job.get('finished_at') is not None]
+    expired = {job_id for job_id, job in finished if now - job['finished_at'] > JOB_RETENTION}
+    kept = [job_id for job_id, _ in finished if job_id not in expired]
+    expired.update(kept[:max(0, len(kept) - JOB_MAX_FINISHED)])
+    for job_id in expired:
+        del _jobs[job_id]
+
+
+def submit_job(video_path, workers=None):
+    job_id = uuid.uuid4().hex
+    with _jobs_lock:
+        _prune_jobs()
+        _jobs[job_id] = {'video_path': video_path, 'status': 'running', 'progress': 0.0, 'result': None,
+                         'submitted': datetime.utcnow()}
+    threading.Thread(target=_run_job, args=(job_id, video_path, workers), name=f'batch-{job_id}', daemon=True).start()
+    return job_id
+
+
+def get_job(job_id):
+    with _jobs_lock:
+        _prune_jobs()
+        return _jobs.get(job_id)
+
+
+def claim(job, key):
+    # Atomic check-and-set of a one-off flag on a job: True for exactly one caller
+    with _jobs_lock:
+        if job.get(key):
+            return False
+        job[key] = True
+        return True
@@ -0,0 +1,226 @@
+import argparse
+import glob
+import json
+import os
+import platform
+import resource
+import sys
+import tempfile
+import time
+
+import cv2
+import numpy as np
+
+import detector_backends
+import metrics
+import model_registry
+
+# Offline throughput benchmark over the bundled media: no network, CPU is enough.
+#   python benchmark.py run [--frames 300] [--backend torch] [--out bench.json]
+#   python benchmark.py compare baseline.json [--threshold 0.10]   -> exit 1 on a regression
+BENCH_IMAGES = 'image/*.jp*g'
+BENCH_VIDEO = 'video/vedio1.mp4'
+BENCH_FRAMES = 300
+BENCH_IMAGE_ROUNDS = 3
+REGRESSION_THRESHOLD = 0.10
+
+# What compare() checks, and whether bigger is better
+CHECKS = [
+    (('image', 'fps'), True),
+    (('image', 'latency_ms', 'p50'), False),
+    (('image', 'latency_ms', 'p95'), False),
+    (('video', 'fps'), True),
+    (('video', 'latency_ms', 'p50'), False),
+    (('video', 'latency_ms', 'p95'), False),
+    (('peak_rss_mb',), False),
+]
+
+
+def _percentiles(samples_ms):
+    if not samples_ms:
+        return {'mean': 0.0, 'p50': 0.0, 'p95': 0.0, 'p99': 0.0, 'max': 0.0}
+    values = np.asarray(samples_ms)
+    return {
+        'mean': round(float(values.mean()), 2),
+        'p50': round(float(np.percentile(values, 50)), 2),
+        'p95': round(float(np.percentile(values, 95)), 2),
+        'p99': round(float(np.percentile(values, 99)), 2),
+        'max': round(float(values.max()), 2),
+    }
+
+
+def _peak_rss_mb():
+    # ru_maxrss is in kilobytes on Linux
+    return round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024.0, 1)
+
+
+def _stage_snapshot(kind):
+    # Current counts of every crowd_stage_seconds histogram of one kind (video/image), by stage
+    return {labels['stage']: (h, h.snapshot())
+            for labels, h in metrics.series('crowd_stage_seconds') if labels.get('kind') == kind}
+
+
+def _stage_breakdown(before, after):
+    # Per-stage mean and percentiles (ms) of only the observations made between the two snapshots
+    stages = {}
+    for stage, (h, (counts, total, count)) in after.items():
+        _, (old_counts, old_total, old_count) = before.get(stage, (h, ([0] * len(counts), 0.0, 0)))
+        diff = [a - b for a, b in zip(counts, old_counts)]
+        n = count - old_count
+        if not n:
+            continue
+        stages[stage] = {
+            'calls': n,
+            'mean_ms': round((total - old_total) / n * 1000.0, 3),
+            **{f'p{int(q * 100)}_ms': round(h.quantile(q, diff, n) * 1000.0, 3) for q in metrics.QUANTILES},
+        }
+    return stages
+
+
+def bench_images(pattern=BENCH_IMAGES, rounds=BENCH_IMAGE_ROUNDS):
+    from crowd_detect import detect_crowd
+
+    paths = sorted(glob.glob(pattern))
+    if not paths:
+        raise FileNotFoundError(f"No benchmark images match {pattern}")
+    latency = []
+    with tempfile.TemporaryDirectory() as out_dir:
+        output = os.path.join(out_dir, 'bench.jpg')
+        detect_crowd(paths[0], output, use_cache=False)        # warm-up, not timed
+        before = _stage_snapshot('image')
+        started = time.perf_counter()
+        for _ in range(rounds):
+            for path in paths:
+                t = time.perf_counter()
+                detect_crowd(path, output, use_cache=False)    # the result cache would skip inference
+                latency.append((time.perf_counter() - t) * 1000.0)
+        elapsed = time.perf_counter() - started
+    return {
+        'images': len(paths),
+        'frames': len(latency),
+        'seconds': round(elapsed, 3),
+        'fps': round(len(latency) / elapsed, 2) if elapsed else 0.0,
+        'latency_ms': _percentiles(latency),
+        'stages': _stage_breakdown(before, _stage_snapshot('image')),
+    }
+
+
+def bench_video(path=BENCH_VIDEO, frames=BENCH_FRAMES, pipelined=False, backend=None):
+    import video_analysis
+
+    if not os.path.exists(path):
+        raise FileNotFoundError(path)
+    # Every run must really detect: no recorded-track replay and no SQLite writes, and every frame goes
+    # to the detector (the motion gate and adaptive stride would make fps depend on the footage)
+    video_analysis.TRACK_LOG_ENABLED = False
+    video_analysis.COUNT_STORE_ENABLED = False
+    latency = []
+    detected = 0
+    before = _stage_snapshot('video')
+    stream = video_analysis.stream_video_with_data(path, pipelined=pipelined, backend=backend,
+                                                   motion_gate=False, adaptive_stride=False)
+    started = last = time.perf_counter()
+    try:
+        for _, data in stream:
+            detected += bool(data.get('detected', True))
+            now = time.perf_counter()
+            latency.append((now - last) * 1000.0)    # unpipelined: one frame end to end; pipelined: output interval
+            last = now
+            if len(latency) >= frames:
+                break
+    finally:
+        stream.close()
+    elapsed = last - started
+    return {
+        'video': path,
+        'frames': len(latency),
+        'detected_frames': detected,
+        'pipelined': pipelined,
+        'seconds': round(elapsed, 3),
+        'fps': round(len(latency) / elapsed, 2) if elapsed else 0.0,
+        'latency_ms': _percentiles(latency),
+        'stages': _stage_breakdown(before, _stage_snapshot('video')),
+    }
+
+
+def run(frames=BENCH_FRAMES, backend=None, pipelined=False, rounds=BENCH_IMAGE_ROUNDS, skip=()):
+    backend = backend or detector_backends.DETECTOR_BACKEND
+    detector_backends.DETECTOR_BACKEND = backend        # crowd_detect leases the default backend
+    started = time.perf_counter()
+    model_registry.get_model(backend)                  # load + warm-up outside the timed sections
+    report = {
+        'backend': backend,
+        'model_load_seconds': round(time.perf_counter() - started, 3),
+        'environment': {
+            'python': platform.python_version(),
+            'platform': platform.platform(),
+            'cpus': os.cpu_count(),
+            'opencv': cv2.__version__,
+            'numpy': np.__version__,
+            'model_workers': model_registry.MODEL_WORKERS,
+        },
+    }
+    if 'image' not in skip:
+        report['image'] = bench_images(rounds=rounds)
+    if 'video' not in skip:
+        report['video'] = bench_video(frames=frames, pipelined=pipelined, backend=backend)
+    report['peak_rss_mb'] = _peak_rss_mb()
+    return report
+
+
+def _lookup(report, path):
+    for key in path:
+        if not isinstance(report, dict) or key not in report:
+            return None
+        report = report[key]
+    return report
+
+
+def compare(report, baseline, threshold=REGRESSION_THRESHOLD):
+    # Relative change of every checked figure; a regression is a change beyond `threshold` in the bad direction
+    rows = []
+    for path, higher_is_better in CHECKS:
+        new, old = _lookup(report, path), _lookup(baseline, path)
+        if new is None or old is None or not old:
+            continue
+        change = (new - old) / old
+        regressed = change < -threshold if higher_is_better else change > threshold
+        rows.append({'metric': '.'.join(path), 'baseline': old, 'current': new,
+                     'change_pct': round(change * 100, 1), 'regressed': regressed})
+    return rows
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Offline crowd-counting throughput benchmark")
+    parser.add_argument('command', choices=['run', 'compare'])
+    parser.add_argument('baseline', nargs='?', help="baseline JSON for compare")
+    parser.add_argument('--frames', type=int, default=BENCH_FRAMES, help="video frames to process")
+    parser.add_argument('--rounds', type=int, default=BENCH_IMAGE_ROUNDS, help="passes over the bundled images")
+    parser.add_argument('--backend', default=None, help="detector backend (default: CROWD_DETECTOR_BACKEND)")
+    parser.add_argument('--pipelined', action='store_true', help="run the threaded video pipeline")
+    parser.add_argument('--skip', action='append', default=[], choices=['image', 'video'])
+    parser.add_argument('--threshold', type=float, default=REGRESSION_THRESHOLD, help="allowed relative slowdown")
+    parser.add_argument('--out', help="also write the report to this file (e.g. a new baseline)")
+    args = parser.parse_args(argv)
+    if args.command == 'compare' and not args.baseline:
+        parser.error("compare needs a baseline file")
+
+    report = run(args.frames, args.backend, args.pipelined, args.rounds, args.skip)
+    if args.out:
+        with open(args.out, 'w') as f:
+            json.dump(report, f, indent=2)
+    if args.command == 'run':
+        print(json.dumps(report, indent=2))
+        return 0
+
+    with open(args.baseline) as f:
+        baseline = json.load(f)
+    rows = compare(report, baseline, args.threshold)
+    failed = [row['metric'] for row in rows if row['regressed']]
+    print(json.dumps({'threshold_pct': args.threshold * 100, 'comparison': rows, 'regressions': failed,
+                      'report': report}, indent=2))
+    return 1 if failed else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,20 @@
+import numpy as np
+
+
+def pairwise_overlap(a, b, over='union'):
+    # Pairwise overlap of (N, 4) and (M, 4) xyxy box arrays as an (N, M) array: intersection over
+    # union (IoU), or with over='min' intersection over the smaller of the two boxes
+    a = np.asarray(a).reshape(-1, 4)
+    b = np.asarray(b).reshape(-1, 4)
+    x1 = np.maximum(a[:, None, 0], b[None, :, 0])
+    y1 = np.maximum(a[:, None, 1], b[None, :, 1])
+    x2 = np.minimum(a[:, None, 2], b[None, :, 2])
+    y2 = np.minimum(a[:, None, 3], b[None, :, 3])
+    inter = np.clip(x2 - x1, 0, None) * np.clip(y2 - y1, 0, None)
+    area_a = (a[:, 2] - a[:, 0]) * (a[:, 3] - a[:, 1])
+    area_b = (b[:, 2] - b[:, 0]) * (b[:, 3] - b[:, 1])
+    if over == 'min':
+        denominator = np.minimum(area_a[:, None], area_b[None, :])
+    else:
+        denominator = area_a[:, None] + area_b[None, :] - inter
+    return inter / np.maximum(denominator, 1e-6)
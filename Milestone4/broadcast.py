@@ -0,0 +1,170 @@
+import threading
+import time
+from collections import deque
+
+SUBSCRIBER_BUFFER = 2        # frames a viewer may fall behind before its oldest frames are dropped
+IDLE_LINGER = 5.0            # seconds a producer keeps running after its last viewer leaves
+
+_END = object()
+
+
+class _Subscriber:
+    def __init__(self, size, viewer=None, source=None):
+        self.buffer = deque(maxlen=size)     # a full deque drops the oldest frame on append
+        self.cond = threading.Condition()
+        self.dropped = 0
+        self.viewer = viewer                 # who is watching, so leave() can end only their streams
+        self.source = source
+
+    def push(self, item):
+        with self.cond:
+            if len(self.buffer) == self.buffer.maxlen and item is not _END:
+                self.dropped += 1
+            self.buffer.append(item)
+            self.cond.notify()
+
+    def pop(self, timeout):
+        with self.cond:
+            if not self.buffer:
+                self.cond.wait(timeout)
+            return self.buffer.popleft() if self.buffer else None
+
+
+class Broadcaster:
+    # Runs one source generator (capture + inference + encode) on its own thread and fans every item
+    # out to all subscribers. Per-viewer buffers are small and drop old frames, so a slow viewer
+    # never stalls the producer or the other viewers.
+
+    def __init__(self, key, factory, on_item=None, buffer_size=SUBSCRIBER_BUFFER, linger=IDLE_LINGER):
+        self.key = key
+        self.factory = factory
+        self.on_item = on_item         # side effects (history, heatmap) that must run once per frame, not per viewer
+        self.buffer_size = buffer_size
+        self.linger = linger
+        self.frames = 0
+        self.finished = False
+        self._subscribers = set()
+        self._lock = threading.Lock()
+        self._thread = threading.Thread(target=self._produce, name=f'broadcast-{key}', daemon=True)
+
+    def start(self):
+        self._thread.start()
+
+    def _produce(self):
+        source = self.factory()
+        try:
+            for item in source:
+                if self.on_item is not None:
+                    self.on_item(item)
+                self.frames += 1
+                with self._lock:
+                    subscribers = list(self._subscribers)
+                for sub in subscribers:
+                    sub.push(item)
+                if not subscribers and not self._viewer_returns():
+                    break
+        finally:
+            source.close()
+            with self._lock:
+                self.finished = True
+                subscribers = list(self._subscribers)
+            for sub in subscribers:
+                sub.push(_END)
+            _forget(self)
+
+    def _viewer_returns(self):
+        # Pause (the source is not advanced) until someone subscribes again or the linger period ends
+        deadline = time.monotonic() + self.linger
+        while time.monotonic() < deadline:
+            with self._lock:
+                if self._subscribers:
+                    return True
+            time.sleep(0.1)
+        return False
+
+    def subscribe(self, viewer=None, source=None):
+        sub = _Subscriber(self.buffer_size, viewer, source)
+        with self._lock:
+            if self.finished:
+                return None
+            self._subscribers.add(sub)
+        return sub
+
+    def unsubscribe(self, sub):
+        with self._lock:
+            self._subscribers.discard(sub)
+
+    def detach(self, viewer, source=None):
+        # Ends this viewer's streams only; the producer keeps serving everyone else and stops on its
+        # own (after the linger period) once nobody is left
+        with self._lock:
+            leaving = [sub for sub in self._subscribers
+                       if sub.viewer == viewer and (source is None or sub.source == source)]
+            for sub in leaving:
+                self._subscribers.discard(sub)
+        for sub in leaving:
+            sub.push(_END)
+        return len(leaving)
+
+    def viewers(self):
+        with self._lock:
+            return len(self._subscribers)
+
+    def dropped(self):
+        with self._lock:
+            return sum(sub.dropped for sub in self._subscribers)
+
+    def stream(self, sub, timeout=1.0):
+        # Generator for one viewer: yields shared items until the source ends or the viewer disconnects
+        try:
+            while True:
+                item = sub.pop(timeout)
+                if item is _END:
+                    return
+                if item is None:
+                    if self.finished and not sub.buffer:
+                        return
+                    continue
+                yield item
+        finally:
+            self.unsubscribe(sub)
+
+
+_hubs = {}
+_hubs_lock = threading.Lock()
+
+
+def _forget(broadcaster):
+    with _hubs_lock:
+        if _hubs.get(broadcaster.key) is broadcaster:
+            del _hubs[broadcaster.key]
+
+
+def watch(key, factory, on_item=None, viewer=None, source=None):
+    # Attach a viewer to the producer for `key`, starting one if none is running
+    while True:
+        with _hubs_lock:
+            broadcaster = _hubs.get(key)
+            created = broadcaster is None
+            if created:
+                broadcaster = _hubs[key] = Broadcaster(key, factory, on_item)
+        sub = broadcaster.subscribe(viewer, source)
+        if sub is not None:
+            break
+        _forget(broadcaster)     # it finished between lookup and subscribe; start a fresh one
+    if created:
+        broadcaster.start()
+    return broadcaster.stream(sub)
+
+
+def leave(viewer, source=None):
+    # The viewer's own stop button: detaches them from every hub (of `source`), nobody else is affected
+    with _hubs_lock:
+        hubs = list(_hubs.values())
+    return sum(b.detach(viewer, source) for b in hubs)
+
+
+def stats():
+    with _hubs_lock:
+        hubs = list(_hubs.values())
+    return [{'source': str(b.key), 'viewers': b.viewers(), 'frames': b.frames, 'dropped': b.dropped()} for b in hubs]
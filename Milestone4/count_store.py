@@ -0,0 +1,220 @@
+import logging
+import queue
+import sqlite3
+import threading
+import time
+
+import app_logging
+
+COUNTS_DB = 'ZoneCounts.db'
+WRITER_QUEUE_SIZE = 10000        # pending samples; beyond this new samples are dropped, never waited on
+WRITER_BATCH_SIZE = 500
+WRITER_FLUSH_SECONDS = 0.5
+RAW_RETENTION_DAYS = 14          # per-frame rows older than this are pruned; minute buckets are kept
+PRUNE_INTERVAL_SECONDS = 3600
+MINUTE_MS = 60_000
+
+log = app_logging.get_logger('count_store')
+EXPORT_CHUNK_ROWS = 5000
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS zone_counts (
+    source TEXT NOT NULL,
+    zone TEXT NOT NULL,
+    ts INTEGER NOT NULL,
+    count INTEGER NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_zone_counts_source_zone_ts ON zone_counts (source, zone, ts);
+CREATE INDEX IF NOT EXISTS idx_zone_counts_ts ON zone_counts (ts);
+CREATE TABLE IF NOT EXISTS zone_counts_minute (
+    source TEXT NOT NULL,
+    zone TEXT NOT NULL,
+    minute INTEGER NOT NULL,
+    samples INTEGER NOT NULL,
+    total INTEGER NOT NULL,
+    peak INTEGER NOT NULL,
+    PRIMARY KEY (source, zone, minute)
+) WITHOUT ROWID;
+"""
+
+_UPSERT_MINUTE = """
+INSERT INTO zone_counts_minute (source, zone, minute, samples, total, peak) VALUES (?, ?, ?, ?, ?, ?)
+ON CONFLICT (source, zone, minute) DO UPDATE SET
+    samples = samples + excluded.samples,
+    total = total + excluded.total,
+    peak = MAX(peak, excluded.peak)
+"""
+
+
+def _connect(path):
+    conn = sqlite3.connect(path, check_same_thread=False)
+    conn.execute('PRAGMA journal_mode=WAL')      # readers never wait for the writer
+    conn.execute('PRAGMA synchronous=NORMAL')
+    return conn
+
+
+class CountStore:
+    # Durable zone-count time series. The frame loop only enqueues (put_nowait); one background
+    # thread writes batches in single transactions, both the raw rows and the pre-aggregated
+    # minute buckets, so range queries at minute granularity or coarser never touch raw rows.
+
+    def __init__(self, path=COUNTS_DB):
+        self.path = path
+        self.dropped = 0
+        self.written = 0
+        self._queue = queue.Queue(maxsize=WRITER_QUEUE_SIZE)
+        conn = _connect(path)
+        conn.executescript(_SCHEMA)
+        conn.commit()
+        conn.close()
+        self._thread = threading.Thread(target=self._write_forever, name='count-store-writer', daemon=True)
+        self._thread.start()
+
+    def record(self, source, zone_counts, ts_ms):
+        try:
+            self._queue.put_nowait((str(source), zone_counts, int(ts_ms)))
+        except queue.Full:
+            self.dropped += 1
+
+    def _take_batch(self):
+        batch = [self._queue.get()]
+        deadline = time.monotonic() + WRITER_FLUSH_SECONDS
+        while len(batch) < WRITER_BATCH_SIZE:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            try:
+                batch.append(self._queue.get(timeout=remaining))
+            except queue.Empty:
+                break
+        return batch
+
+    def _write(self, conn, batch):
+        # One transaction: raw rows plus their minute buckets
+        rows = []
+        minutes = {}         # (source, zone, minute) -> [samples, total, peak]
+        for source, zone_counts, ts in batch:
+            minute = ts - ts % MINUTE_MS
+            for zone, count in zone_counts.items():
+                count = int(count)
+                rows.append((source, zone, ts, count))
+                bucket = minutes.setdefault((source, zone, minute), [0, 0, 0])
+                bucket[0] += 1
+                bucket[1] += count
+                bucket[2] = max(bucket[2], count)
+        with conn:
+            conn.executemany('INSERT INTO zone_counts (source, zone, ts, count) VALUES (?, ?, ?, ?)', rows)
+            conn.executemany(_UPSERT_MINUTE, [key + tuple(value) for key, value in minutes.items()])
+        self.written += len(batch)
+
+    def extend(self, source, zone_series, timestamps_ms):
+        # Bulk load of a finished batch job ({zone: [count per frame]}), written synchronously instead
+        # of through the bounded queue so a long video is never partly dropped
+        zones = list(zone_series)
+        batch = [(str(source), dict(zip(zones, counts)), int(ts))
+                 for ts, counts in zip(timestamps_ms, zip(*zone_series.values()))]
+        conn = _connect(self.path)
+        try:
+            self._write(conn, batch)
+        finally:
+            conn.close()
+
+    def _write_forever(self):
+        conn = _connect(self.path)
+        last_prune = 0.0
+        while True:
+            batch = self._take_batch()
+            try:
+                self._write(conn, batch)
+            except sqlite3.Error as e:
+                app_logging.event(log, logging.ERROR, "write failed", samples=len(batch), error=str(e))
+            if time.monotonic() - last_prune > PRUNE_INTERVAL_SECONDS:
+                last_prune = time.monotonic()
+                cutoff = int(time.time() * 1000) - RAW_RETENTION_DAYS * 86_400_000
+                try:
+                    with conn:
+                        conn.execute('DELETE FROM zone_counts WHERE ts < ?', (cutoff,))
+                except sqlite3.Error as e:
+                    # e.g. "database is locked": retried at the next interval, the writer keeps running
+                    app_logging.event(log, logging.ERROR, "prune failed", error=str(e))
+
+    def _bucket_sql(self, source, start_ms, end_ms, bucket_seconds, zones):
+        # Buckets that are whole minutes are answered from the minute table; finer buckets use the
+        # (source, zone, ts) index on raw rows
+        bucket_ms = max(1, int(bucket_seconds * 1000))
+        zone_filter, params = '', []
+        if zones:
+            zone_filter = f" AND zone IN ({', '.join('?' for _ in zones)})"
+            params = list(zones)
+        if bucket_ms % MINUTE_MS == 0:
+            sql = (f"SELECT minute - minute % ?, zone, SUM(total) * 1.0 / SUM(samples), MAX(peak), SUM(samples) "
+                   f"FROM zone_counts_minute WHERE source = ? AND minute >= ? AND minute < ?{zone_filter} "
+                   f"GROUP BY 1, zone ORDER BY 1, zone")
+            start_ms -= start_ms % MINUTE_MS
+        else:
+            sql = (f"SELECT ts - ts % ?, zone, AVG(count), MAX(count), COUNT(*) "
+                   f"FROM zone_counts WHERE source = ? AND ts >= ? AND ts < ?{zone_filter} "
+                   f"GROUP BY 1, zone ORDER BY 1, zone")
+        return sql, [bucket_ms, str(source), start_ms, end_ms] + params
+
+    def iter_rows(self, source, start_ms, end_ms, bucket_seconds=None, zones=None, chunk_rows=EXPORT_CHUNK_ROWS):
+        # Yields lists of (ts, zone, value...) in ts order, chunk_rows at a time, so exporting months of
+        # data holds one chunk in memory. Without a bucket: raw (ts, zone, count) rows.
+        if bucket_seconds:
+            sql, params = self._bucket_sql(source, start_ms, end_ms, bucket_seconds, zones)
+        else:
+            zone_filter = f" AND zone IN ({', '.join('?' for _ in zones)})" if zones else ''
+            sql = (f"SELECT ts, zone, count FROM zone_counts WHERE source = ? AND ts >= ? AND ts < ?{zone_filter} "
+                   f"ORDER BY ts")
+            params = [str(source), start_ms, end_ms] + list(zones or [])
+        conn = _connect(self.path)
+        try:
+            cursor = conn.execute(sql, params)
+            while True:
+                rows = cursor.fetchmany(chunk_rows)
+                if not rows:
+                    break
+                yield rows
+        finally:
+            conn.close()
+
+    def query(self, source, start_ms, end_ms, bucket_seconds=60, zones=None):
+        # Mean/max per zone per bucket in [start_ms, end_ms)
+        return [{'ts': ts, 'zone': zone, 'mean': round(mean, 2), 'max': peak, 'samples': samples}
+                for rows in self.iter_rows(source, start_ms, end_ms, bucket_seconds, zones)
+                for ts, zone, mean, peak, samples in rows]
+
+    def zones(self, source):
+        conn = _connect(self.path)
+        try:
+            return [row[0] for row in conn.execute(
+                'SELECT DISTINCT zone FROM zone_counts_minute WHERE source = ? ORDER BY zone', (str(source),))]
+        finally:
+            conn.close()
+
+    def sources(self):
+        conn = _connect(self.path)
+        try:
+            return [row[0] for row in conn.execute('SELECT DISTINCT source FROM zone_counts_minute')]
+        finally:
+            conn.close()
+
+    def stats(self):
+        return {'pending': self._queue.qsize(), 'written': self.written, 'dropped': self.dropped}
+
+
+_store = None
+_store_lock = threading.Lock()
+
+
+def get_store():
+    global _store
+    if _store is None:
+        with _store_lock:
+            if _store is None:
+                _store = CountStore()
+    return _store
+
+
+def stats():
+    return _store.stats() if _store is not None else None
@@ -1,64 +1,155 @@
-import torch
+import os
+import time
 import cv2
-from ultralytics import YOLO
-import ultralytics.nn.tasks as tasks
+import numpy as np
+import detector_backends
+from box_ops import pairwise_overlap
+import result_cache
+import zones
+import model_registry
+import metrics
+from metrics import stage_timer
 
-# Allow saving/loading model safely with custom DetectionModel class
-torch.serialization.add_safe_globals([tasks.DetectionModel])
+# Tiled (sliced) inference for large, dense crowd images: overlapping tiles are detected in batches
+# and merged with cross-tile suppression, so small distant people are not downscaled away
+TILE_SIZE = 640
+TILE_OVERLAP = 0.2
+TILE_BATCH = 8
+TILE_MERGE_THRESHOLD = 0.6     # intersection over the smaller box; catches halves of people cut at tile edges
 
-# Load the YOLOv8 model (pretrained)
-model = YOLO("yolov8n.pt")
 
-def detect_crowd(image_path, output_path):
-    img = cv2.imread(image_path)
+def _tile_windows(width, height, size=TILE_SIZE, overlap=TILE_OVERLAP):
+    step = max(1, int(size * (1 - overlap)))
+    xs = list(range(0, max(width - size, 0) + 1, step))
+    ys = list(range(0, max(height - size, 0) + 1, step))
+    if xs[-1] + size < width:
+        xs.append(width - size)
+    if ys[-1] + size < height:
+        ys.append(height - size)
+    return [(x, y, min(x + size, width), min(y + size, height)) for y in ys for x in xs]
+
+
+def _merge_boxes(boxes, scores, sources, threshold=TILE_MERGE_THRESHOLD):
+    # Greedy suppression by score, using intersection over the smaller box, but only between boxes
+    # from different passes (two tiles, or a tile and the full image). Boxes from the same pass were
+    # already separated by YOLO's own NMS, so overlapping people in a dense crowd are kept.
+    order = np.argsort(-scores)
+    keep = []
+    while len(order):
+        i, rest = order[0], order[1:]
+        keep.append(i)
+        overlap = pairwise_overlap(boxes[i], boxes[rest], over='min')[0]
+        order = rest[(overlap < threshold) | (sources[rest] == sources[i])]
+    return boxes[keep]
+
+
+def _detect_tiled(model, img):
+    height, width = img.shape[:2]
+    # An image no bigger than one tile would only repeat the full-image pass
+    windows = _tile_windows(width, height) if width > TILE_SIZE or height > TILE_SIZE else []
+    all_boxes, all_scores, all_sources = [], [], []
+
+    # Full-image pass keeps large, nearby people that no single tile contains
+    crops = [img] + [img[y1:y2, x1:x2] for x1, y1, x2, y2 in windows]
+    offsets = [(0, 0)] + [(x1, y1) for x1, y1, _, _ in windows]
+    for i in range(0, len(crops), TILE_BATCH):
+        results = model(crops[i:i + TILE_BATCH], classes=[0], verbose=False)
+        for source, ((ox, oy), result) in enumerate(zip(offsets[i:i + TILE_BATCH], results), i):
+            if len(result.boxes):
+                all_boxes.append(result.boxes.xyxy.cpu().numpy() + [ox, oy, ox, oy])
+                all_scores.append(result.boxes.conf.cpu().numpy())
+                all_sources.append(np.full(len(result.boxes), source))
+
+    if not all_boxes:
+        return []
+    merged = _merge_boxes(np.concatenate(all_boxes), np.concatenate(all_scores), np.concatenate(all_sources))
+    return merged.astype(int).tolist()
+
+def _zone_result(zone_counts, boxes, output_path):
+    # 'zone1'/'zone2' keep the original keys for the first zone and the outside zone
+    names = list(zone_counts)
+    return {'zone1': zone_counts[names[0]], 'zone2': zone_counts[names[-1]], 'zones': zone_counts,
+            'boxes': boxes, 'output_path': output_path}
+
+
+def _cache_config(tiled, ext):
+    # Everything besides the image bytes that changes the result
+    layout = zones.get_layout('image', kind='image')
+    config = {'backend': detector_backends.DETECTOR_BACKEND, 'zones': layout.signature(), 'format': ext, 'tiled': tiled}
+    if tiled:
+        config['tiles'] = [TILE_SIZE, TILE_OVERLAP, TILE_MERGE_THRESHOLD]
+    return config
+
+
+def detect_crowd(image_path, output_path, tiled=False, use_cache=True):
+    ext = os.path.splitext(output_path)[1].lower() or '.jpg'
+    key = None
+    if use_cache and os.path.exists(image_path):
+        # Same upload (even under a new timestamp filename) and same config: skip inference entirely
+        key = result_cache.make_key(result_cache.file_digest(image_path), _cache_config(tiled, ext))
+        hit = result_cache.get_cache().get(key)
+        if hit is not None:
+            entry, image = hit
+            with open(output_path, 'wb') as f:
+                f.write(image)
+            result = _zone_result(entry['zones'], entry['boxes'], output_path)
+            result['cached'] = True
+            return entry['total'], result
+
+    with stage_timer('decode', 'image'):
+        img = cv2.imread(image_path)
     if img is None:
         raise ValueError(f"Image not found or unable to load: {image_path}")
     
     height, width, _ = img.shape
     
-    # Define zone1 boundary - left one-third of image width
-    zone1_boundary = width // 3
+    # Zones for still images (default: left one-third of the width is Zone 1)
+    layout = zones.get_layout('image', kind='image').for_size(width, height)
     
-    # Draw vertical line to separate zones (blue line)
-    cv2.line(img, (zone1_boundary, 0), (zone1_boundary, height), (255, 0, 0), 2)
+    # Draw zone boundaries (blue lines)
+    layout.draw(img, color=(255, 0, 0), thickness=2)
     
     # Detect only persons (class 0)
-    results = model(img, classes=[0])
+    with stage_timer('detect', 'image'), model_registry.lease() as model:
+        started = time.perf_counter()
+        if tiled:
+            boxes = _detect_tiled(model, img)
+        else:
+            results = model(img, classes=[0])
+        metrics.observe_model(detector_backends.DETECTOR_BACKEND, time.perf_counter() - started)
+    if not tiled:
+        boxes = [list(map(int, box.xyxy[0])) for box in results[0].boxes
+                 if results[0].names[int(box.cls[0])] == 'person']
     
-    total_count = 0
-    zone1_count = 0
-    zone2_count = 0
+    # Zone of every box centre in one lookup, counts per zone in one bincount
+    with stage_timer('zones', 'image'):
+        labels = layout.assign(layout.centers(boxes))
+        zone_counts = layout.counts(labels)
+    total_count = len(boxes)
     
-    for box in results[0].boxes:
-        cls = int(box.cls[0])
-        if results[0].names[cls] == 'person':
-            total_count += 1
-            x1, y1, x2, y2 = map(int, box.xyxy[0])
-            
-            # Calculate center x coordinate of bounding box
-            center_x = (x1 + x2) // 2
-            
-            # Determine zone based on center_x
-            if center_x <= zone1_boundary:
-                zone1_count += 1
-                box_color = (0, 255, 0)  # Green for Zone 1
-            else:
-                zone2_count += 1
-                box_color = (0, 165, 255)  # Orange for Zone 2
-            
+    with stage_timer('draw', 'image'):
+        for (x1, y1, x2, y2), label in zip(boxes, labels.tolist()):
             # Draw bounding box with zone-specific color
-            cv2.rectangle(img, (x1, y1), (x2, y2), box_color, 3)
-    
-    # Add text for total people and zone counts
-    cv2.putText(img, f"Total People: {total_count}", (40, 40), 
-                cv2.FONT_HERSHEY_SIMPLEX, 1, (0, 0, 255), 2)
-    cv2.putText(img, f"Zone 1: {zone1_count}", (40, 80), 
-                cv2.FONT_HERSHEY_SIMPLEX, 1, (0, 255, 0), 2)
-    cv2.putText(img, f"Zone 2: {zone2_count}", (40, 120), 
-                cv2.FONT_HERSHEY_SIMPLEX, 1, (0, 165, 255), 2)
+            cv2.rectangle(img, (x1, y1), (x2, y2), layout.colors[label], 3)
+        
+        # Add text for total people and zone counts
+        cv2.putText(img, f"Total People: {total_count}", (40, 40), 
+                    cv2.FONT_HERSHEY_SIMPLEX, 1, (0, 0, 255), 2)
+        for i, (label, name) in enumerate(layout.display_order(), 1):
+            cv2.putText(img, f"{name}: {zone_counts[name]}", (40, 40 + 40 * i), 
+                        cv2.FONT_HERSHEY_SIMPLEX, 1, layout.colors[label], 2)
     
     # Save the annotated image to output_path
-    cv2.imwrite(output_path, img)
+    with stage_timer('encode', 'image'):
+        ok, buffer = cv2.imencode(ext, img)
+        image = buffer.tobytes()
+    with open(output_path, 'wb') as f:
+        f.write(image)
+    
+    boxes = [list(map(int, box)) for box in boxes]
+    if key is not None:
+        entry = {'total': total_count, 'zones': zone_counts, 'boxes': boxes}
+        result_cache.get_cache().put(key, entry, image)
     
     # Return total count and zone-wise counts as dict
-    return total_count, {'zone1': zone1_count, 'zone2': zone2_count, 'output_path': output_path}
+    return total_count, _zone_result(zone_counts, boxes, output_path)
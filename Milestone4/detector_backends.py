@@ -0,0 +1,103 @@
+import glob
+import os
+import sys
+
+# Every backend loader returns an object with the YOLO call/predict/track API, so results keep the
+# usual results[0].boxes.xyxy / .cls / .id / .names structure whatever runtime runs the network.
+TORCH_WEIGHTS = 'yolov8n.pt'
+ONNX_MODEL = 'yolov8n.onnx'
+OPENVINO_MODEL = 'yolov8n_openvino_model'
+INT8_MODEL = 'yolov8n_int8.onnx'         # post-training quantised, calibrated on our footage (quantize.py)
+
+# Selected backend; override per worker with the CROWD_DETECTOR_BACKEND environment variable
+DETECTOR_BACKEND = os.environ.get('CROWD_DETECTOR_BACKEND', 'torch')
+
+
+def _load_torch():
+    import torch
+    from ultralytics import YOLO
+    import ultralytics.nn.tasks as tasks
+
+    # Allow saving/loading model safely with custom DetectionModel class
+    torch.serialization.add_safe_globals([tasks.DetectionModel])
+    return YOLO(TORCH_WEIGHTS)
+
+
+def _load_exported(path, fmt):
+    from ultralytics import YOLO
+    if not os.path.exists(path):
+        # Export once from the local .pt weights; no download is involved
+        export(fmt)
+    return YOLO(path, task='detect')
+
+
+def _load_int8():
+    from ultralytics import YOLO
+    if not os.path.exists(INT8_MODEL):
+        import quantize
+        quantize.build_int8(INT8_MODEL)
+    return YOLO(INT8_MODEL, task='detect')
+
+
+def _load_stub():
+    # Scripted/synthetic boxes with simulated latency; needs neither weights nor torch (stub_detector.py)
+    import stub_detector
+    return stub_detector.StubDetector()
+
+
+def export(fmt):
+    # dynamic=True keeps the batch dimension free so several frames can share one forward pass
+    return _load_torch().export(format=fmt, dynamic=True)
+
+
+BACKENDS = {
+    'torch': _load_torch,
+    'onnx': lambda: _load_exported(ONNX_MODEL, 'onnx'),
+    'openvino': lambda: _load_exported(OPENVINO_MODEL, 'openvino'),
+    'int8': _load_int8,
+    'stub': _load_stub,
+}
+
+
+def register_backend(name, loader):
+    BACKENDS[name] = loader
+
+
+def load_backend(name):
+    if name not in BACKENDS:
+        raise ValueError(f"Unknown detector backend '{name}'. Available: {', '.join(sorted(BACKENDS))}")
+    return BACKENDS[name]()
+
+
+def check_parity(backend, images=None, reference='torch', min_iou=0.9, max_count_diff=1):
+    # Runs both backends on the same images and checks people counts and box overlap agree
+    import cv2
+    from box_ops import pairwise_overlap
+    images = images or sorted(glob.glob('image/*.jp*g'))
+    ref_model = load_backend(reference)
+    model = load_backend(backend)
+    report = []
+    ok = True
+    for path in images:
+        img = cv2.imread(path)
+        ref = ref_model(img, classes=[0], verbose=False)[0].boxes.xyxy.cpu().numpy()
+        out = model(img, classes=[0], verbose=False)[0].boxes.xyxy.cpu().numpy()
+        mean_iou = float(pairwise_overlap(ref, out).max(axis=1).mean()) if len(ref) and len(out) else float(len(ref) == len(out))
+        passed = abs(len(ref) - len(out)) <= max_count_diff and mean_iou >= min_iou
+        ok = ok and passed
+        report.append({'image': path, reference: len(ref), backend: len(out), 'mean_iou': round(mean_iou, 4), 'passed': passed})
+    return ok, report
+
+
+if __name__ == '__main__':
+    # python detector_backends.py export onnx|openvino
+    # python detector_backends.py parity onnx|openvino
+    command, name = sys.argv[1], sys.argv[2]
+    if command == 'export':
+        print(export(name))
+    elif command == 'parity':
+        ok, report = check_parity(name)
+        for row in report:
+            print(row)
+        print("PASS" if ok else "FAIL")
+        sys.exit(0 if ok else 1)
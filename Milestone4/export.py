@@ -0,0 +1,131 @@
+import csv
+import io
+import zlib
+
+EXPORT_FORMATS = ('csv', 'csv.gz', 'parquet')
+PARQUET_ROW_GROUP = 50000
+
+
+def columns(zones, bucketed):
+    # Same names as the original CSV: area1count, area2count, ... in layout order, timestamp last
+    areas = [f'area{i}count' for i in range(1, len(zones) + 1)]
+    if not bucketed:
+        return areas + ['timestamp']
+    return [f'{area}_mean' for area in areas] + [f'{area}_max' for area in areas] + ['timestamp']
+
+
+def wide_rows(chunks, zones, bucketed):
+    # Pivots ts-ordered (ts, zone, value...) rows into one row per timestamp, a chunk at a time
+    from zone_history import iso        # zone_history pulls in numpy; not needed to import the app
+    position = {zone: i for i, zone in enumerate(zones)}
+    width = len(zones)
+    current_ts, values = None, None
+    for chunk in chunks:
+        out = []
+        for ts, zone, *rest in chunk:
+            if ts != current_ts:
+                if current_ts is not None:
+                    out.append(values + [iso(current_ts)])
+                current_ts = ts
+                values = [0] * (width * (2 if bucketed else 1))
+            i = position.get(zone)
+            if i is None:
+                continue
+            if bucketed:
+                values[i] = round(rest[0], 2)
+                values[width + i] = rest[1]
+            else:
+                values[i] = rest[0]
+        if out:
+            yield out
+    if current_ts is not None:
+        yield [values + [iso(current_ts)]]
+
+
+def csv_chunks(rows, header, compress=False):
+    # Encoded CSV pieces; with compress=True one continuous gzip stream across all pieces
+    gz = zlib.compressobj(6, zlib.DEFLATED, 31) if compress else None
+    def encode(text):
+        data = text.encode('utf-8')
+        return gz.compress(data) if gz is not None else data
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(header)
+    for chunk in rows:
+        writer.writerows(chunk)
+        piece = encode(buffer.getvalue())
+        buffer.seek(0)
+        buffer.truncate()
+        if piece:
+            yield piece
+    piece = encode(buffer.getvalue())
+    if gz is not None:
+        piece += gz.flush()
+    if piece:
+        yield piece
+
+
+class _ChunkSink:
+    # Write-only file object that hands each written block back to the response generator
+    def __init__(self):
+        self.blocks = []
+        self.position = 0
+        self.closed = False
+
+    def write(self, data):
+        self.blocks.append(bytes(data))
+        self.position += len(data)
+        return len(data)
+
+    def tell(self):
+        return self.position
+
+    def flush(self):
+        pass
+
+    def close(self):
+        self.closed = True
+
+    def drain(self):
+        data = b''.join(self.blocks)
+        self.blocks = []
+        return data
+
+
+def parquet_chunks(rows, header, row_group=PARQUET_ROW_GROUP):
+    # Parquet written one row group at a time straight into the response; needs pyarrow
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+
+    types = [pa.float64()] * (len(header) - 1) + [pa.string()]
+    schema = pa.schema([pa.field(name, t) for name, t in zip(header, types)])
+    sink = _ChunkSink()
+    writer = pq.ParquetWriter(sink, schema, compression='zstd')
+    pending = []
+    def write(batch):
+        table = pa.Table.from_arrays([pa.array(list(col), type=t) for col, t in zip(zip(*batch), types)], schema=schema)
+        writer.write_table(table)
+    try:
+        for chunk in rows:
+            pending.extend(chunk)
+            if len(pending) >= row_group:
+                write(pending)
+                pending = []
+                data = sink.drain()
+                if data:
+                    yield data
+        if pending:
+            write(pending)
+    finally:
+        writer.close()
+    data = sink.drain()
+    if data:
+        yield data
+
+
+def have_parquet():
+    try:
+        import pyarrow.parquet
+    except ImportError:
+        return False
+    return True
@@ -0,0 +1,88 @@
+import math
+import threading
+import time
+
+import cv2
+import numpy as np
+
+HEATMAP_CELL = 8               # frame pixels per density grid cell
+HEATMAP_HALF_LIFE = 30.0       # seconds for an old detection's weight to halve
+HEATMAP_BLUR = 3               # Gaussian sigma in cells, applied only when rendering
+HEATMAP_BACKGROUND = (63, 30, 21)       # BGR of the dashboard's dark blue
+_RESCALE_AT = 20.0             # half-lives (a weight of about 1e6) before the grid is renormalised
+_UNDERFLOW_AT = 1000.0         # half-lives after which every stored detection has decayed to nothing
+
+
+class DensityHeatmap:
+    # Decaying density of box centres on a coarse grid. Instead of multiplying the whole grid down
+    # every frame, new detections are added with a weight that grows as 2**(t / half_life), so an
+    # update costs O(detections); the grid is renormalised once that weight gets large, on every call
+    # (empty frames too), so the exponent stays bounded however long a camera watches an empty scene.
+    # Rendering (blur, colour map, PNG) happens on request and the last render is cached.
+
+    def __init__(self, frame_size=(1024, 576), cell=HEATMAP_CELL, half_life=HEATMAP_HALF_LIFE):
+        self.width, self.height = frame_size
+        self.cell = cell
+        self.half_life = half_life
+        self.grid = np.zeros((math.ceil(self.height / cell), math.ceil(self.width / cell)), dtype=np.float64)
+        self.version = 0
+        self._origin = time.monotonic()
+        self._lock = threading.Lock()
+        self._rendered = (None, None)      # (version, png bytes)
+
+    def _weight(self, now):
+        # Caller holds the lock. Rebases the origin first, so 2**x is only ever taken of x <= _RESCALE_AT.
+        if not self.half_life:
+            return 1.0
+        exponent = max(0.0, (now - self._origin) / self.half_life)      # `now` read before another call rebased
+        if exponent > _RESCALE_AT:
+            if exponent > _UNDERFLOW_AT:
+                self.grid[:] = 0.0
+            else:
+                self.grid /= 2.0 ** exponent
+            self._origin = now
+            self.version += 1
+            exponent = 0.0
+        return 2.0 ** exponent
+
+    def add(self, centers, now=None):
+        centers = np.asarray(centers, dtype=np.int64).reshape(-1, 2)
+        now = time.monotonic() if now is None else now
+        with self._lock:
+            weight = self._weight(now)
+            if not len(centers):
+                return
+            cols = np.clip(centers[:, 0] // self.cell, 0, self.grid.shape[1] - 1)
+            rows = np.clip(centers[:, 1] // self.cell, 0, self.grid.shape[0] - 1)
+            np.add.at(self.grid, (rows, cols), weight)
+            self.version += 1
+
+    def density(self, now=None):
+        # Current decayed density (a detection made right now counts 1.0)
+        now = time.monotonic() if now is None else now
+        with self._lock:
+            return self.grid / self._weight(now)
+
+    def render_png(self, layout=None):
+        # Decay scales every cell equally and the render is normalised to its peak, so the image
+        # only changes when detections are added (or the zones change)
+        key = (self.version, layout.signature() if layout is not None else None)
+        with self._lock:
+            cached_key, png = self._rendered
+            if cached_key == key:
+                return png
+        density = cv2.GaussianBlur(self.density().astype(np.float32), (0, 0), HEATMAP_BLUR)
+        peak = float(density.max())
+        level = np.zeros(density.shape, dtype=np.uint8) if peak <= 0 else \
+            np.clip(density / peak * 255.0, 0, 255).astype(np.uint8)
+        level = cv2.resize(level, (self.width, self.height), interpolation=cv2.INTER_LINEAR)
+        colored = cv2.applyColorMap(level, cv2.COLORMAP_JET)
+        alpha = (level.astype(np.float32) / 255.0)[:, :, None]
+        image = (colored * alpha + np.array(HEATMAP_BACKGROUND, dtype=np.float32) * (1 - alpha)).astype(np.uint8)
+        if layout is not None:
+            layout.for_size(self.width, self.height).draw(image, color=(255, 255, 255), thickness=2)
+        ok, buffer = cv2.imencode('.png', image)
+        png = buffer.tobytes()
+        with self._lock:
+            self._rendered = (key, png)
+        return png
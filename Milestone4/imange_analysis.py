@@ -1,7 +1,5 @@
 import cv2
-from ultralytics import YOLO
-
-model = YOLO('yolov8n.pt')
+from model_registry import get_model
 
 _video_unique_ids = {}
 _video_in_zone_ids = {}
@@ -21,6 +19,7 @@ def put_text_rect(frame, text, pos, scale=1, thickness=2, color=(255,255,255), b
     cv2.putText(frame, text, (x + 5, y - 5), font, scale, color, thickness)
 
 def stream_video_with_data(video_path):
+    model = get_model()
     cap = cv2.VideoCapture(video_path)
     _video_unique_ids.setdefault(video_path, set())
     _video_in_zone_ids.setdefault(video_path, set())
@@ -93,6 +92,7 @@ def get_zone_count(video_path):
     return len(_video_in_zone_ids.get(video_path, set()))
 
 def detect_crowd_in_zone(image_path):
+    model = get_model()
     frame = cv2.imread(image_path)
     ids_in_zone1 = set()
     unique_ids = set()
@@ -0,0 +1,55 @@
+import threading
+import time
+
+import cv2
+
+
+class LatestFrameGrabber:
+    # Reads the camera on its own thread and keeps only the newest frame. The consumer (inference)
+    # always gets the most recent picture instead of draining OpenCV's internal buffer, which is
+    # what made the live view lag seconds behind reality. Older unconsumed frames are counted as dropped.
+
+    def __init__(self, session, source=0):
+        self.session = session
+        self.cap = session.capture(cv2.VideoCapture(source))
+        self.cap.set(cv2.CAP_PROP_BUFFERSIZE, 1)      # honoured by some backends (V4L2, DirectShow)
+        self.grabbed = 0
+        self.dropped = 0
+        self._cond = threading.Condition()
+        self._frame = None
+        self._captured_at = None
+        self._seq = 0
+        self._ended = False
+        self._thread = threading.Thread(target=self._run, name='webcam-grab', daemon=True)
+        self._thread.start()
+
+    def _run(self):
+        try:
+            while not self.session.stopped:
+                ret, frame = self.session.read(self.cap)
+                captured_at = time.perf_counter()
+                if not ret:
+                    break
+                with self._cond:
+                    if self._frame is not None:
+                        self.dropped += 1
+                    self._frame, self._captured_at = frame, captured_at
+                    self._seq += 1
+                    self.grabbed += 1
+                    self._cond.notify()
+        finally:
+            with self._cond:
+                self._ended = True
+                self._cond.notify()
+
+    def latest(self, timeout=0.5):
+        # Newest frame not yet handed out: (sequence number, frame, perf_counter at capture),
+        # or None once the camera is closed or the session stopped
+        with self._cond:
+            while self._frame is None:
+                if self._ended or self.session.stopped:
+                    return None
+                self._cond.wait(timeout)
+            frame, captured_at = self._frame, self._captured_at
+            self._frame = None
+            return self._seq, frame, captured_at
@@ -0,0 +1,146 @@
+import threading
+import time
+from bisect import bisect_left
+
+# Seconds; covers a sub-millisecond resize up to a multi-second CPU detection
+STAGE_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0)
+QUANTILES = (0.5, 0.95, 0.99)
+
+
+class Histogram:
+    # Fixed-bucket histogram: observe() is a bisect and two adds under a lock (about a microsecond)
+    def __init__(self, buckets=STAGE_BUCKETS):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)       # last slot is +Inf
+        self.sum = 0.0
+        self.count = 0
+        self._lock = threading.Lock()
+
+    def observe(self, value):
+        i = bisect_left(self.buckets, value)
+        with self._lock:
+            self.counts[i] += 1
+            self.sum += value
+            self.count += 1
+
+    def snapshot(self):
+        with self._lock:
+            return list(self.counts), self.sum, self.count
+
+    def quantile(self, q, counts=None, count=None):
+        # Linear interpolation inside the bucket holding the q-th observation (as histogram_quantile does)
+        if counts is None:
+            counts, _, count = self.snapshot()
+        if not count:
+            return 0.0
+        rank = q * count
+        seen = 0
+        for i, n in enumerate(counts):
+            if seen + n >= rank and n:
+                lower = self.buckets[i - 1] if i > 0 else 0.0
+                upper = self.buckets[i] if i < len(self.buckets) else self.buckets[-1]
+                return lower + (upper - lower) * (rank - seen) / n
+            seen += n
+        return self.buckets[-1]
+
+
+class _Timer:
+    __slots__ = ('histogram', 'start')
+
+    def __init__(self, histogram):
+        self.histogram = histogram
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self.histogram.observe(time.perf_counter() - self.start)
+        return False
+
+
+_histograms = {}       # (metric name, sorted label items) -> Histogram
+_help = {}
+_collectors = []
+_lock = threading.Lock()
+
+
+def histogram(name, help_text='', **labels):
+    key = (name, tuple(sorted(labels.items())))
+    h = _histograms.get(key)
+    if h is None:
+        with _lock:
+            h = _histograms.setdefault(key, Histogram())
+            _help.setdefault(name, help_text)
+    return h
+
+
+_stages = {}           # (stage, kind) -> Histogram, skips the label sort on the per-frame path
+
+
+def stage_timer(stage, kind):
+    # with stage_timer('encode', 'video'): ...  -> crowd_stage_seconds{stage="encode",kind="video"}
+    h = _stages.get((stage, kind))
+    if h is None:
+        h = _stages[(stage, kind)] = histogram('crowd_stage_seconds', 'Time spent per frame in each processing stage',
+                                               stage=stage, kind=kind)
+    return _Timer(h)
+
+
+def observe_model(backend, seconds, batch=1):
+    histogram('crowd_model_seconds', 'Detector forward pass time per call', backend=backend).observe(seconds)
+    histogram('crowd_model_batch_seconds_per_frame', 'Detector time per frame of a batch', backend=backend).observe(seconds / max(batch, 1))
+
+
+def series(name):
+    # [(labels dict, Histogram)] of every label set recorded under one metric name
+    with _lock:
+        return [(dict(labels), h) for (n, labels), h in _histograms.items() if n == name]
+
+
+def register_collector(fn):
+    # fn() -> iterable of (name, type, help, [(labels dict, value), ...]) read at scrape time
+    _collectors.append(fn)
+
+
+def _labels(items):
+    if not items:
+        return ''
+    text = ','.join('{}="{}"'.format(k, str(v).replace('\\', '\\\\').replace('"', '\\"').replace('\n', ' '))
+                    for k, v in items)
+    return '{' + text + '}'
+
+
+def render():
+    # Prometheus text exposition format (version 0.0.4)
+    lines = []
+    with _lock:
+        histograms = sorted(_histograms.items())
+    by_name = {}
+    for (name, labels), h in histograms:
+        by_name.setdefault(name, []).append((labels, h))
+    for name, series in by_name.items():
+        lines.append(f'# HELP {name} {_help.get(name, "")}')
+        lines.append(f'# TYPE {name} histogram')
+        quantile_lines = []
+        for labels, h in series:
+            counts, total, count = h.snapshot()
+            cumulative = 0
+            for bound, n in zip(list(h.buckets) + ['+Inf'], counts):
+                cumulative += n
+                lines.append(f'{name}_bucket{_labels(labels + (("le", bound),))} {cumulative}')
+            lines.append(f'{name}_sum{_labels(labels)} {total:.6f}')
+            lines.append(f'{name}_count{_labels(labels)} {count}')
+            for q in QUANTILES:
+                quantile_lines.append(f'{name}_quantile{_labels(labels + (("quantile", q),))} '
+                                      f'{h.quantile(q, counts, count):.6f}')
+        lines.append(f'# HELP {name}_quantile p50/p95/p99 estimated from {name} buckets')
+        lines.append(f'# TYPE {name}_quantile gauge')
+        lines.extend(quantile_lines)
+    for collect in list(_collectors):
+        for name, kind, help_text, samples in collect():
+            lines.append(f'# HELP {name} {help_text}')
+            lines.append(f'# TYPE {name} {kind}')
+            for labels, value in samples:
+                lines.append(f'{name}{_labels(tuple(sorted(labels.items())))} {value}')
+    return '\n'.join(lines) + '\n'
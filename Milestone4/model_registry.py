@@ -0,0 +1,161 @@
+import logging
+import os
+import queue
+import threading
+import time
+from contextlib import contextmanager
+
+import app_logging
+import detector_backends
+
+WARMUP_SHAPE = (576, 1024, 3)     # same size the video/webcam streams resize frames to
+
+# Streams share a bounded pool of model replicas per backend instead of one object: an ultralytics
+# model keeps its predictor on the instance, so concurrent calls on one object are not safe. Kept
+# small, since each replica is a copy of the weights. The batch scheduler runs one worker per replica,
+# so streaming inference keeps every replica busy.
+MODEL_WORKERS = int(os.environ.get('CROWD_MODEL_WORKERS', 0)) or min(2, os.cpu_count() or 1)
+# The cores are split between the replicas that run at once, as batch_analysis does between its processes
+TORCH_THREADS = max(1, (os.cpu_count() or 1) // MODEL_WORKERS)
+
+_models = {}          # backend name -> loaded model instance (one per process)
+_warm = set()         # backend names that already ran a warm-up inference
+_locks = {}
+_locks_guard = threading.Lock()
+_pools = {}           # backend name -> (queue of idle replicas, number of replicas created)
+_pools_lock = threading.Lock()
+_torch_threads = None
+_preloads = {}        # backend name -> background load thread
+_load_errors = {}     # backend name -> why the last background load failed
+_load_seconds = {}
+
+log = app_logging.get_logger('model_registry')
+
+
+def _lock_for(name):
+    with _locks_guard:
+        return _locks.setdefault(name, threading.Lock())
+
+
+def _warm_up(name, model):
+    # One dummy inference builds the predictor and pays the first-call cost up front
+    import numpy as np
+    dummy = np.zeros(WARMUP_SHAPE, dtype=np.uint8)
+    model(dummy, classes=[0], verbose=False)
+    _warm.add(name)
+
+
+def set_torch_threads(threads):
+    # First caller wins (a batch worker process sets its own share before loading a model)
+    global _torch_threads
+    if _torch_threads is None:
+        try:
+            import torch
+        except ImportError:
+            return      # stub/onnx-only install: nothing to size
+        torch.set_num_threads(threads)
+        _torch_threads = threads
+
+
+def _load(name):
+    if name == 'torch':
+        set_torch_threads(TORCH_THREADS)     # N replicas x all-core intra-op threads would oversubscribe
+    return detector_backends.load_backend(name)
+
+
+def get_model(backend=None, warm=True):
+    name = backend or detector_backends.DETECTOR_BACKEND
+    model = _models.get(name)
+    if model is not None and (not warm or name in _warm):
+        return model
+    # Callers arriving while a load/warm-up is in progress wait for it instead of loading a second copy
+    with _lock_for(name):
+        model = _models.get(name)
+        if model is None:
+            model = _load(name)
+            _models[name] = model
+        if warm and name not in _warm:
+            _warm_up(name, model)
+    return model
+
+
+def is_ready(backend=None):
+    return (backend or detector_backends.DETECTOR_BACKEND) in _warm
+
+
+def _preload(name):
+    started = time.perf_counter()
+    try:
+        get_model(name)
+    except Exception as e:
+        _load_errors[name] = f'{type(e).__name__}: {e}'
+        app_logging.event(log, logging.ERROR, "model preload failed", backend=name, error=_load_errors[name])
+        return
+    _load_errors.pop(name, None)
+    _load_seconds[name] = round(time.perf_counter() - started, 2)
+    app_logging.event(log, logging.INFO, "model ready", backend=name, load_seconds=_load_seconds[name])
+
+
+def preload(backend=None):
+    # Idempotent: one background load + warm-up per backend; a failed load is retried on the next call
+    name = backend or detector_backends.DETECTOR_BACKEND
+    with _locks_guard:
+        thread = _preloads.get(name)
+        if thread is None or (not thread.is_alive() and name in _load_errors):
+            thread = threading.Thread(target=_preload, args=(name,), name=f'preload-{name}', daemon=True)
+            _preloads[name] = thread
+            thread.start()
+    return thread
+
+
+def status(backend=None):
+    name = backend or detector_backends.DETECTOR_BACKEND
+    thread = _preloads.get(name)
+    return {
+        'backend': name,
+        'ready': name in _warm,
+        'loading': thread is not None and thread.is_alive(),
+        'load_seconds': _load_seconds.get(name),
+        'error': _load_errors.get(name),
+    }
+
+
+def _checkout(name):
+    with _pools_lock:
+        idle, created = _pools.get(name, (None, 0))
+        if idle is None:
+            idle = queue.Queue()
+        try:
+            return idle, idle.get_nowait()
+        except queue.Empty:
+            pass
+        grow = created < MODEL_WORKERS
+        _pools[name] = (idle, created + 1 if grow else created)
+    if not grow:
+        return idle, idle.get()       # every replica is busy: wait for one to come back
+    try:
+        if created == 0:
+            return idle, get_model(name)  # the first replica is the shared instance
+        model = _load(name)
+        _warm_up(name, model)
+        return idle, model
+    except Exception:
+        with _pools_lock:
+            _pools[name] = (idle, _pools[name][1] - 1)
+        raise
+
+
+@contextmanager
+def lease(backend=None):
+    # Exclusive use of one replica for the duration of a call; at most MODEL_WORKERS run at once
+    idle, model = _checkout(backend or detector_backends.DETECTOR_BACKEND)
+    try:
+        yield model
+    finally:
+        idle.put(model)
+
+
+def pool_stats():
+    with _pools_lock:
+        return {name: {'replicas': created, 'idle': idle.qsize(), 'max': MODEL_WORKERS}
+                for name, (idle, created) in _pools.items()}
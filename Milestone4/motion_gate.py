@@ -0,0 +1,51 @@
+import cv2
+
+
+class MotionGate:
+    # Cheap frame-difference check in front of the detector. Frames are compared, downscaled and
+    # blurred, against the last frame the detector actually ran on; if almost nothing changed the
+    # caller reuses the previous detections instead of running YOLO again.
+
+    def __init__(self, size=(96, 54), pixel_threshold=18, min_changed=0.001, max_static_frames=75):
+        self.size = size
+        self.pixel_threshold = pixel_threshold      # grey-level change that counts a pixel as "moved"
+        self.min_changed = min_changed              # share of moved pixels needed to call it motion
+        self.max_static_frames = max_static_frames  # force a real detection at least this often
+        self.last = None                            # detections to reuse on static frames
+        self._reference = None
+        self._static_run = 0
+        self.checks = 0
+        self.hits = 0
+
+    def _small(self, frame):
+        gray = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY)
+        small = cv2.resize(gray, self.size, interpolation=cv2.INTER_AREA)
+        return cv2.GaussianBlur(small, (3, 3), 0)
+
+    def is_static(self, frame):
+        self.checks += 1
+        small = self._small(frame)
+        if self._reference is None or self.last is None or self._static_run >= self.max_static_frames:
+            static = False
+        else:
+            diff = cv2.absdiff(small, self._reference)
+            changed = cv2.countNonZero(cv2.threshold(diff, self.pixel_threshold, 255, cv2.THRESH_BINARY)[1])
+            static = changed < self.min_changed * diff.size
+        if static:
+            self.hits += 1
+            self._static_run += 1
+        else:
+            # Only moving frames become the new reference, so slow drift still adds up and triggers
+            self._reference = small
+            self._static_run = 0
+        return static
+
+    def remember(self, *detections):
+        self.last = detections
+
+    def stats(self):
+        return {
+            'checks': self.checks,
+            'skipped': self.hits,
+            'hit_rate': round(self.hits / self.checks, 4) if self.checks else 0.0,
+        }
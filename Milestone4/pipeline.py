@@ -0,0 +1,115 @@
+import queue
+import threading
+
+OVERFLOW_BLOCK = 'block'     # a full queue makes the upstream stage wait (backpressure, no frames lost)
+OVERFLOW_DROP = 'drop'       # a full queue discards its oldest item so downstream always sees fresh frames
+
+_DONE = object()
+
+_active = {}        # id -> queues and drop counter of each running pipeline, for stats()
+_active_lock = threading.Lock()
+
+
+class _StageError:
+    def __init__(self, error):
+        self.error = error
+
+
+def _put(q, item, overflow, stop, state=None):
+    if overflow == OVERFLOW_DROP and item is not _DONE and not isinstance(item, _StageError):
+        while not stop.is_set():
+            try:
+                q.put_nowait(item)
+                return
+            except queue.Full:
+                try:
+                    q.get_nowait()      # throw away the stalest frame
+                    if state is not None:
+                        state['dropped'] += 1
+                except queue.Empty:
+                    pass
+        return
+    while not stop.is_set():
+        try:
+            q.put(item, timeout=0.1)
+            return
+        except queue.Full:
+            continue
+
+
+def _get(q, stop):
+    while not stop.is_set():
+        try:
+            return q.get(timeout=0.1)
+        except queue.Empty:
+            continue
+    return _DONE
+
+
+def _feed(source, out_q, overflow, stop, state=None):
+    try:
+        for item in source:
+            if stop.is_set():
+                break
+            _put(out_q, item, overflow, stop, state)
+    except Exception as e:
+        _put(out_q, _StageError(e), overflow, stop)
+    finally:
+        close = getattr(source, 'close', None)
+        if close is not None:
+            close()
+        _put(out_q, _DONE, overflow, stop)
+
+
+def _work(fn, in_q, out_q, overflow, stop, state=None):
+    while True:
+        item = _get(in_q, stop)
+        if item is _DONE or isinstance(item, _StageError):
+            _put(out_q, item, overflow, stop)
+            return
+        try:
+            result = fn(item)
+        except Exception as e:
+            _put(out_q, _StageError(e), overflow, stop)
+            return
+        if result is not None:       # a stage may return None to skip an item
+            _put(out_q, result, overflow, stop, state)
+
+
+def run_pipeline(source, stages, queue_size=4, overflow=OVERFLOW_BLOCK, name='pipeline'):
+    # Runs `source` and each stage function on its own thread, connected by bounded queues,
+    # and yields the last stage's output in order. Closing the generator stops every thread.
+    stop = threading.Event()
+    queues = [queue.Queue(maxsize=queue_size) for _ in range(len(stages) + 1)]
+    state = {'name': name, 'queues': queues, 'dropped': 0}
+    with _active_lock:
+        _active[id(state)] = state
+    threads = [threading.Thread(target=_feed, args=(source, queues[0], overflow, stop, state),
+                                name=f'{name}-source', daemon=True)]
+    for i, fn in enumerate(stages):
+        threads.append(threading.Thread(target=_work, args=(fn, queues[i], queues[i + 1], overflow, stop, state),
+                                        name=f'{name}-stage{i}', daemon=True))
+    for t in threads:
+        t.start()
+    try:
+        while True:
+            item = _get(queues[-1], stop)
+            if item is _DONE:
+                break
+            if isinstance(item, _StageError):
+                raise item.error
+            yield item
+    finally:
+        stop.set()
+        with _active_lock:
+            _active.pop(id(state), None)
+        for t in threads:
+            t.join(timeout=1.0)
+
+
+def stats():
+    # Queue depth between each pair of stages and frames dropped so far, per running pipeline
+    with _active_lock:
+        running = list(_active.values())
+    return [{'name': state['name'], 'depths': [q.qsize() for q in state['queues']], 'dropped': state['dropped']}
+            for state in running]
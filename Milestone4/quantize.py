@@ -0,0 +1,124 @@
+import glob
+import json
+import os
+import sys
+import time
+
+import cv2
+import numpy as np
+
+import detector_backends
+
+CALIBRATION_VIDEO = 'video/vedio1.mp4'
+CALIBRATION_IMAGES = 'image/*.jp*g'
+CALIBRATION_EVERY = 15        # take every Nth video frame
+CALIBRATION_LIMIT = 200
+INPUT_SIZE = 640
+
+
+def calibration_frames(video=CALIBRATION_VIDEO, images=CALIBRATION_IMAGES, every=CALIBRATION_EVERY, limit=CALIBRATION_LIMIT):
+    # Frames from our own footage, so activation ranges match what the cameras actually see
+    count = 0
+    for path in sorted(glob.glob(images)):
+        img = cv2.imread(path)
+        if img is not None:
+            count += 1
+            yield img
+    cap = cv2.VideoCapture(video)
+    index = 0
+    try:
+        while count < limit:
+            ret, frame = cap.read()
+            if not ret:
+                break
+            if index % every == 0:
+                count += 1
+                yield cv2.resize(frame, (1024, 576))
+            index += 1
+    finally:
+        cap.release()
+
+
+def _preprocess(img, size=INPUT_SIZE):
+    # Same letterbox the ultralytics predictor applies: keep aspect, pad with grey 114, RGB, 0..1, NCHW
+    h, w = img.shape[:2]
+    scale = min(size / h, size / w)
+    nh, nw = int(round(h * scale)), int(round(w * scale))
+    canvas = np.full((size, size, 3), 114, dtype=np.uint8)
+    top, left = (size - nh) // 2, (size - nw) // 2
+    canvas[top:top + nh, left:left + nw] = cv2.resize(img, (nw, nh), interpolation=cv2.INTER_LINEAR)
+    blob = canvas[:, :, ::-1].transpose(2, 0, 1)[None].astype(np.float32) / 255.0
+    return np.ascontiguousarray(blob)
+
+
+def build_int8(output=detector_backends.INT8_MODEL):
+    import onnx
+    from onnxruntime.quantization import CalibrationDataReader, QuantFormat, QuantType, quantize_static
+
+    fp32_path = detector_backends.ONNX_MODEL
+    if not os.path.exists(fp32_path):
+        detector_backends.export('onnx')
+    fp32 = onnx.load(fp32_path)
+    input_name = fp32.graph.input[0].name
+
+    class _Reader(CalibrationDataReader):
+        def __init__(self):
+            self._frames = calibration_frames()
+
+        def get_next(self):
+            img = next(self._frames, None)
+            return None if img is None else {input_name: _preprocess(img)}
+
+    quantize_static(fp32_path, output, _Reader(), quant_format=QuantFormat.QDQ, per_channel=True,
+                    activation_type=QuantType.QUInt8, weight_type=QuantType.QInt8)
+
+    # Carry over the ultralytics metadata (class names, stride, imgsz) so YOLO() can load the INT8 file
+    int8 = onnx.load(output)
+    del int8.metadata_props[:]
+    int8.metadata_props.extend(fp32.metadata_props)
+    onnx.save(int8, output)
+    return output
+
+
+def _percentile(values, q):
+    return round(float(np.percentile(values, q)), 2) if values else 0.0
+
+
+def report(candidate='int8', reference='torch', frames=None):
+    # People counts and latency of `candidate` against the FP32 `reference` on our own footage
+    frames = frames if frames is not None else list(calibration_frames())
+    models = {name: detector_backends.load_backend(name) for name in (reference, candidate)}
+    counts = {name: [] for name in models}
+    latency = {name: [] for name in models}
+    for name, model in models.items():
+        model(frames[0], classes=[0], verbose=False)      # warm-up, not timed
+        for img in frames:
+            start = time.perf_counter()
+            result = model(img, classes=[0], verbose=False)
+            latency[name].append((time.perf_counter() - start) * 1000.0)
+            counts[name].append(len(result[0].boxes))
+
+    ref_counts = np.array(counts[reference])
+    cand_counts = np.array(counts[candidate])
+    abs_err = np.abs(cand_counts - ref_counts)
+    return {
+        'frames': len(frames),
+        'count_mae': round(float(abs_err.mean()), 3),
+        'count_mape': round(float((abs_err / np.maximum(ref_counts, 1)).mean() * 100), 2),
+        'total_people': {reference: int(ref_counts.sum()), candidate: int(cand_counts.sum())},
+        'latency_ms': {
+            name: {'mean': round(float(np.mean(v)), 2), 'p50': _percentile(v, 50), 'p95': _percentile(v, 95)}
+            for name, v in latency.items()
+        },
+        'speedup': round(float(np.mean(latency[reference]) / np.mean(latency[candidate])), 2),
+    }
+
+
+if __name__ == '__main__':
+    # python quantize.py calibrate          -> writes yolov8n_int8.onnx from bundled footage
+    # python quantize.py report [backend]   -> counts/latency of backend (default int8) vs torch FP32
+    command = sys.argv[1] if len(sys.argv) > 1 else 'report'
+    if command == 'calibrate':
+        print(build_int8())
+    else:
+        print(json.dumps(report(sys.argv[2] if len(sys.argv) > 2 else 'int8'), indent=2))
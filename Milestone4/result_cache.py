@@ -0,0 +1,121 @@
+import hashlib
+import json
+import os
+import threading
+from collections import OrderedDict
+
+CACHE_DIR = 'cache/images'
+CACHE_MAX_MEMORY_BYTES = 64 * 1024 * 1024
+CACHE_MAX_DISK_BYTES = 512 * 1024 * 1024
+
+
+def file_digest(path, chunk_size=1024 * 1024):
+    h = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(chunk_size), b''):
+            h.update(chunk)
+    return h.hexdigest()
+
+
+def make_key(digest, config):
+    # Same bytes analysed with a different detector/zone setup must not share an entry
+    config_text = json.dumps(config, sort_keys=True)
+    return hashlib.sha256(f'{digest}:{config_text}'.encode()).hexdigest()
+
+
+class ResultCache:
+    # Two-level LRU: recent entries in memory, everything else on disk, each level capped in bytes.
+    # An entry is a small JSON-able dict (counts, zones, boxes) plus the annotated image bytes.
+
+    def __init__(self, directory=CACHE_DIR, max_memory_bytes=CACHE_MAX_MEMORY_BYTES, max_disk_bytes=CACHE_MAX_DISK_BYTES):
+        self.directory = directory
+        self.max_memory_bytes = max_memory_bytes
+        self.max_disk_bytes = max_disk_bytes
+        self._memory = OrderedDict()     # key -> (entry, image bytes, size)
+        self._memory_bytes = 0
+        self._disk = OrderedDict()       # key -> size on disk, least recently used first
+        self._disk_bytes = 0
+        self._lock = threading.Lock()
+        os.makedirs(directory, exist_ok=True)
+        self._scan_disk()
+
+    def _paths(self, key):
+        return os.path.join(self.directory, key + '.json'), os.path.join(self.directory, key + '.img')
+
+    def _scan_disk(self):
+        found = []
+        for name in os.listdir(self.directory):
+            if name.endswith('.json'):
+                key = name[:-5]
+                meta_path, image_path = self._paths(key)
+                if os.path.exists(image_path):
+                    size = os.path.getsize(meta_path) + os.path.getsize(image_path)
+                    found.append((os.path.getmtime(meta_path), key, size))
+        for _, key, size in sorted(found):
+            self._disk[key] = size
+            self._disk_bytes += size
+
+    def _remember(self, key, entry, image):
+        size = len(image) + len(json.dumps(entry))
+        if key in self._memory:
+            self._memory_bytes -= self._memory.pop(key)[2]
+        self._memory[key] = (entry, image, size)
+        self._memory_bytes += size
+        while self._memory_bytes > self.max_memory_bytes and len(self._memory) > 1:
+            self._memory_bytes -= self._memory.popitem(last=False)[1][2]
+
+    def get(self, key):
+        with self._lock:
+            if key in self._memory:
+                self._memory.move_to_end(key)
+                if key in self._disk:
+                    self._disk.move_to_end(key)
+                entry, image, _ = self._memory[key]
+                return entry, image
+            if key not in self._disk:
+                return None
+            meta_path, image_path = self._paths(key)
+            try:
+                with open(meta_path) as f:
+                    entry = json.load(f)
+                with open(image_path, 'rb') as f:
+                    image = f.read()
+            except (OSError, ValueError):
+                self._disk_bytes -= self._disk.pop(key)
+                return None
+            os.utime(meta_path)      # keep disk LRU order across restarts
+            self._disk.move_to_end(key)
+            self._remember(key, entry, image)
+            return entry, image
+
+    def put(self, key, entry, image):
+        with self._lock:
+            self._remember(key, entry, image)
+            meta_path, image_path = self._paths(key)
+            for path, data, mode in ((image_path, image, 'wb'), (meta_path, json.dumps(entry), 'w')):
+                tmp = path + '.tmp'
+                with open(tmp, mode) as f:
+                    f.write(data)
+                os.replace(tmp, path)
+            size = os.path.getsize(meta_path) + os.path.getsize(image_path)
+            self._disk_bytes += size - self._disk.pop(key, 0)
+            self._disk[key] = size
+            while self._disk_bytes > self.max_disk_bytes and len(self._disk) > 1:
+                old_key, old_size = self._disk.popitem(last=False)
+                self._disk_bytes -= old_size
+                for path in self._paths(old_key):
+                    if os.path.exists(path):
+                        os.remove(path)
+
+
+_cache = None
+_cache_lock = threading.Lock()
+
+
+def get_cache():
+    global _cache
+    if _cache is None:
+        with _cache_lock:
+            if _cache is None:
+                _cache = ResultCache()
+    return _cache
@@ -0,0 +1,162 @@
+import queue
+import threading
+import time
+from concurrent.futures import Future
+
+import detector_backends
+import metrics
+import model_registry
+
+SCHEDULER_MAX_BATCH = 8
+SCHEDULER_MAX_WAIT_MS = 10.0      # longest a frame waits for others to join its batch
+DELAY_BUCKETS_MS = [1, 2, 5, 10, 20, 50, 100, 200, 500]
+
+
+class _Request:
+    def __init__(self, frame):
+        self.frame = frame
+        self.future = Future()
+        self.queued = time.perf_counter()
+
+
+class InferenceScheduler:
+    # Collects frames from every active stream of one backend into micro-batches and runs one forward
+    # pass per batch. A batch closes when it is full, when every attached stream has a frame in it
+    # (each stream waits for its result, so no more can come), or when the oldest frame has waited
+    # max_wait_ms. Results go back through per-frame futures to each stream's own tracker.
+    # One worker thread per model replica, so batches run on every replica (and every core) at once.
+
+    def __init__(self, backend, max_batch=SCHEDULER_MAX_BATCH, max_wait_ms=SCHEDULER_MAX_WAIT_MS, conf=0.25,
+                 workers=None):
+        self.backend = backend
+        self.max_batch = max_batch
+        self.max_wait = max_wait_ms / 1000.0
+        self.conf = conf
+        self._queue = queue.Queue()
+        self._clients = 0
+        self._held = 0                # frames collected by a worker and not yet answered
+        self._lock = threading.Lock()
+        self._collecting = threading.Lock()      # one worker fills a batch while the others run theirs
+        self._batch_sizes = [0] * (max_batch + 1)
+        self._delays = [0] * (len(DELAY_BUCKETS_MS) + 1)
+        self._frames = 0
+        self._batches = 0
+        self._threads = [threading.Thread(target=self._run, name=f'scheduler-{backend}-{i}', daemon=True)
+                         for i in range(workers or model_registry.MODEL_WORKERS)]
+        for thread in self._threads:
+            thread.start()
+
+    def attach(self):
+        with self._lock:
+            self._clients += 1
+        return _Client(self)
+
+    def _detach(self):
+        with self._lock:
+            self._clients -= 1
+
+    def submit(self, frame):
+        request = _Request(frame)
+        self._queue.put(request)
+        return request.future
+
+    def _collect(self):
+        batch = [self._queue.get()]
+        deadline = batch[0].queued + self.max_wait
+        while len(batch) < self.max_batch:
+            with self._lock:
+                waiting = self._clients - self._held     # streams whose frame no other worker holds
+            if len(batch) >= waiting:
+                break
+            # Past the deadline only frames that are already queued still join the batch
+            remaining = deadline - time.perf_counter()
+            try:
+                batch.append(self._queue.get(timeout=remaining) if remaining > 0 else self._queue.get_nowait())
+            except queue.Empty:
+                break
+        return batch
+
+    def _run(self):
+        while True:
+            with self._collecting:
+                batch = self._collect()
+                with self._lock:
+                    self._held += len(batch)
+            try:
+                self._infer(batch)
+            finally:
+                with self._lock:
+                    self._held -= len(batch)
+
+    def _infer(self, batch):
+        started = time.perf_counter()
+        try:
+            with model_registry.lease(self.backend) as model:
+                results = model.predict([r.frame for r in batch], classes=[0], conf=self.conf, verbose=False)
+        except Exception as e:
+            for request in batch:
+                request.future.set_exception(e)
+            return
+        metrics.observe_model(self.backend, time.perf_counter() - started, len(batch))
+        self._record(batch, started)
+        for request, result in zip(batch, results):
+            request.future.set_result(result)
+
+    def _record(self, batch, started):
+        with self._lock:
+            self._batches += 1
+            self._frames += len(batch)
+            self._batch_sizes[len(batch)] += 1
+            for request in batch:
+                delay_ms = (started - request.queued) * 1000.0
+                bucket = next((i for i, bound in enumerate(DELAY_BUCKETS_MS) if delay_ms <= bound), len(DELAY_BUCKETS_MS))
+                self._delays[bucket] += 1
+
+    def stats(self):
+        with self._lock:
+            return {
+                'backend': self.backend,
+                'clients': self._clients,
+                'workers': len(self._threads),
+                'pending': self._queue.qsize(),
+                'batches': self._batches,
+                'frames': self._frames,
+                'mean_batch_size': round(self._frames / self._batches, 2) if self._batches else 0.0,
+                'batch_size': {str(size): n for size, n in enumerate(self._batch_sizes) if n},
+                'queue_delay_ms': {(f'<={bound}' if i < len(DELAY_BUCKETS_MS) else f'>{DELAY_BUCKETS_MS[-1]}'): n
+                                   for i, (bound, n) in enumerate(zip(DELAY_BUCKETS_MS + [None], self._delays))},
+            }
+
+
+class _Client:
+    # One attached stream: counts towards "everyone has submitted" until closed
+    def __init__(self, scheduler):
+        self.scheduler = scheduler
+        self._closed = False
+
+    def detect(self, frame):
+        # Blocks until this frame's batch has run; returns the frame's ultralytics Results
+        return self.scheduler.submit(frame).result()
+
+    def close(self):
+        if not self._closed:
+            self._closed = True
+            self.scheduler._detach()
+
+
+_schedulers = {}
+_schedulers_lock = threading.Lock()
+
+
+def get_scheduler(backend=None):
+    name = backend or detector_backends.DETECTOR_BACKEND
+    with _schedulers_lock:
+        if name not in _schedulers:
+            _schedulers[name] = InferenceScheduler(name)
+        return _schedulers[name]
+
+
+def stats():
+    with _schedulers_lock:
+        schedulers = list(_schedulers.values())
+    return [s.stats() for s in schedulers]
@@ -0,0 +1,230 @@
+import threading
+import time
+import uuid
+from collections import OrderedDict, deque
+
+SESSION_IDLE_TIMEOUT = 30.0     # seconds without a produced frame before a session is considered abandoned
+SESSION_RETENTION = 300.0       # finished sessions stay queryable (final counts) this long
+SESSION_MAX_FINISHED = 32       # and at most this many are kept per server
+REAP_INTERVAL = 5.0
+LATENCY_WINDOW = 300            # recent per-frame latencies kept for the p50/p95 figures
+FPS_SMOOTHING = 0.1             # weight of the newest frame interval in the moving-average frame rate
+UNIQUE_ID_WINDOW = 4096         # most recently seen track ids remembered per stream for de-duplication
+
+
+class IdCounter:
+    # Number of distinct track ids a stream has seen, in bounded memory. Trackers hand out new ids and
+    # only bring an id back within a short lost-track buffer, so remembering the most recent ids is
+    # enough to avoid double counting; a set of every id ever seen grew for as long as a camera ran.
+
+    def __init__(self, window=UNIQUE_ID_WINDOW):
+        self.window = window
+        self.count = 0
+        self._recent = OrderedDict()
+
+    def update(self, ids):
+        for track_id in ids:
+            if track_id in self._recent:
+                self._recent.move_to_end(track_id)
+                continue
+            self._recent[track_id] = None
+            self.count += 1
+            if len(self._recent) > self.window:
+                self._recent.popitem(last=False)
+
+    def __len__(self):
+        return self.count
+
+
+class StreamSession:
+    # Everything one running stream owns: tracking state, counters, its stop handle and its
+    # capture handles. Created when a stream starts, closed by the stream itself or by the reaper.
+
+    def __init__(self, source):
+        self.id = uuid.uuid4().hex
+        self.source = source
+        self.unique_ids = IdCounter()
+        self.in_zone_ids = set()
+        self.gate = None
+        self.stride = None
+        self.tracker = None
+        self.heatmap = None
+        from zone_history import ZoneHistory       # numpy; only loaded once a stream starts
+        self.history = ZoneHistory()
+        self.viewers = set()            # users allowed to read this session's history and heatmap
+        self.frames = 0
+        self.fps = 0.0
+        self.dropped_frames = 0         # frames the source produced that were never processed (webcam)
+        self._interval = None
+        self.latency = deque(maxlen=LATENCY_WINDOW)
+        self.created = time.monotonic()
+        self.last_seen = self.created
+        self.finished_at = None
+        self.lock = threading.Lock()        # guards capture reads against a release from the reaper
+        self._stop = threading.Event()
+        self._captures = []
+        self._on_close = []
+
+    def touch(self):
+        now = time.monotonic()
+        if self.frames:
+            dt = now - self.last_seen
+            self._interval = dt if self._interval is None else self._interval + FPS_SMOOTHING * (dt - self._interval)
+            self.fps = 1.0 / self._interval if self._interval > 0 else 0.0
+        self.last_seen = now
+        self.frames += 1
+
+    def record_latency(self, ms):
+        self.latency.append(ms)
+
+    def latency_stats(self):
+        samples = sorted(self.latency)
+        if not samples:
+            return {'samples': 0}
+        return {
+            'samples': len(samples),
+            'last_ms': round(self.latency[-1], 1),
+            'p50_ms': round(samples[len(samples) // 2], 1),
+            'p95_ms': round(samples[min(len(samples) - 1, int(len(samples) * 0.95))], 1),
+            'max_ms': round(samples[-1], 1),
+        }
+
+    def stop(self):
+        self._stop.set()
+
+    @property
+    def stopped(self):
+        return self._stop.is_set()
+
+    @property
+    def finished(self):
+        return self.finished_at is not None
+
+    def capture(self, cap):
+        # Register a cv2.VideoCapture so close() (possibly from the reaper thread) releases it
+        with self.lock:
+            self._captures.append(cap)
+        return cap
+
+    def on_close(self, fn):
+        # Extra cleanup (e.g. detaching from the inference scheduler) run once when the session closes
+        self._on_close.append(fn)
+
+    def read(self, cap):
+        with self.lock:
+            if self.finished:
+                return False, None
+            return cap.read()
+
+    def close(self):
+        # Idempotent: releases capture handles and tracker state, keeps the final counters
+        self._stop.set()
+        with self.lock:
+            for cap in self._captures:
+                cap.release()
+            self._captures = []
+            if self.finished_at is not None:
+                return
+            self.finished_at = time.monotonic()
+            callbacks, self._on_close = self._on_close, []
+        self.tracker = None
+        for fn in callbacks:
+            fn()
+
+    def stats(self):
+        return {
+            'id': self.id,
+            'source': self.source,
+            'frames': self.frames,
+            'fps': round(self.fps, 1),
+            'dropped_frames': self.dropped_frames,
+            'unique_count': len(self.unique_ids),
+            'zone_count': len(self.in_zone_ids),
+            'history_rows': len(self.history),
+            'age_seconds': round(time.monotonic() - self.created, 1),
+            'idle_seconds': round(time.monotonic() - self.last_seen, 1),
+            'latency': self.latency_stats(),
+            'finished': self.finished,
+            'stopped': self.stopped,
+        }
+
+
+class SessionManager:
+    def __init__(self, idle_timeout=SESSION_IDLE_TIMEOUT, retention=SESSION_RETENTION,
+                 max_finished=SESSION_MAX_FINISHED, interval=REAP_INTERVAL):
+        self.idle_timeout = idle_timeout
+        self.retention = retention
+        self.max_finished = max_finished
+        self.interval = interval
+        self._sessions = {}     # id -> StreamSession, insertion (= start) order
+        self._lock = threading.Lock()
+        self._reaper = None
+
+    def open(self, source):
+        session = StreamSession(source)
+        with self._lock:
+            self._sessions[session.id] = session
+            if self._reaper is None:
+                self._reaper = threading.Thread(target=self._reap_forever, name='session-reaper', daemon=True)
+                self._reaper.start()
+        return session
+
+    def get(self, session_id):
+        with self._lock:
+            return self._sessions.get(session_id)
+
+    def latest(self, source=None, viewer=None):
+        # Most recently started session for a source, or of any source (running or recently finished);
+        # with `viewer`, only sessions that user has watched
+        with self._lock:
+            for session in reversed(list(self._sessions.values())):
+                if (source is None or session.source == source) and (viewer is None or viewer in session.viewers):
+                    return session
+        return None
+
+    def running(self, source=None):
+        with self._lock:
+            return [s for s in self._sessions.values()
+                    if not s.finished and (source is None or s.source == source)]
+
+    def stop(self, source):
+        # Stops every running session of a source for all viewers (shutdown/admin use; a viewer's own
+        # stop button only detaches them, see broadcast.leave)
+        sessions = self.running(source)
+        for session in sessions:
+            session.stop()
+        return len(sessions)
+
+    def reap(self):
+        now = time.monotonic()
+        with self._lock:
+            sessions = list(self._sessions.values())
+        for session in sessions:
+            if not session.finished and now - session.last_seen > self.idle_timeout:
+                session.close()      # client went away without closing the stream
+        with self._lock:
+            finished = [s for s in self._sessions.values() if s.finished]
+            expired = {s.id for s in finished if now - s.finished_at > self.retention}
+            kept = [s for s in finished if s.id not in expired]
+            expired.update(s.id for s in kept[:max(0, len(kept) - self.max_finished)])
+            for session_id in expired:
+                del self._sessions[session_id]
+        return len(expired)
+
+    def _reap_forever(self):
+        while True:
+            time.sleep(self.interval)
+            self.reap()
+
+    def stats(self, viewer=None):
+        # viewer=None: every session (admins, metrics); otherwise only the sessions that user watched
+        with self._lock:
+            sessions = list(self._sessions.values())
+        return [s.stats() for s in sessions if viewer is None or viewer in s.viewers]
+
+
+_manager = SessionManager()
+
+
+def get_manager():
+    return _manager
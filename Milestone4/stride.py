@@ -0,0 +1,61 @@
+import numpy as np
+
+
+class AdaptiveStride:
+    # Runs the detector only every `stride` frames and carries track boxes forward in between
+    # using each track's constant velocity. The stride widens while the scene is calm and
+    # narrows as soon as people move quickly or tracks appear/disappear.
+
+    def __init__(self, min_stride=1, max_stride=6, motion_low=0.02, motion_high=0.08, churn_high=0.2,
+                 frame_size=(1024, 576)):
+        self.min_stride = min_stride
+        self.max_stride = max_stride
+        self.motion_low = motion_low          # mean centre shift per frame, as a fraction of box height
+        self.motion_high = motion_high
+        self.churn_high = churn_high          # share of tracks that appeared or vanished since last detection
+        self.frame_w, self.frame_h = frame_size
+        self.stride = min_stride
+        self._ids = None
+        self._boxes = None
+        self._velocity = None
+        self._since = 0
+
+    def due(self):
+        return self._boxes is None or self._since + 1 >= self.stride
+
+    def observe(self, ids, boxes):
+        # Called with the detector/tracker output on every detected frame
+        ids = np.asarray(ids, dtype=int).reshape(-1)
+        boxes = np.asarray(boxes, dtype=np.float32).reshape(-1, 4)
+        elapsed = self._since + 1
+        velocity = np.zeros_like(boxes)
+        motion = 0.0
+        churn = 0.0
+
+        if self._ids is not None:
+            prev = {int(i): b for i, b in zip(self._ids, self._boxes)}
+            matched = [k for k, i in enumerate(ids) if int(i) in prev]
+            if matched:
+                prev_boxes = np.array([prev[int(ids[k])] for k in matched])
+                velocity[matched] = (boxes[matched] - prev_boxes) / elapsed
+                centre_shift = np.abs(velocity[matched, 0:2] + velocity[matched, 2:4]) / 2
+                heights = np.maximum(boxes[matched, 3] - boxes[matched, 1], 1.0)
+                motion = float(np.mean(np.hypot(centre_shift[:, 0], centre_shift[:, 1]) / heights))
+            union = len(set(prev) | set(ids.tolist()))
+            churn = (union - len(matched)) / union if union else 0.0
+
+        if motion > self.motion_high or churn > self.churn_high:
+            self.stride = max(self.min_stride, self.stride // 2)
+        elif motion < self.motion_low and churn == 0.0:
+            self.stride = min(self.max_stride, self.stride + 1)
+
+        self._ids, self._boxes, self._velocity = ids, boxes, velocity
+        self._since = 0
+
+    def carry(self):
+        # Boxes for a skipped frame, extrapolated from the last detection
+        self._since += 1
+        boxes = self._boxes + self._velocity * self._since
+        boxes[:, [0, 2]] = np.clip(boxes[:, [0, 2]], 0, self.frame_w - 1)
+        boxes[:, [1, 3]] = np.clip(boxes[:, [1, 3]], 0, self.frame_h - 1)
+        return self._ids, boxes.astype(int)
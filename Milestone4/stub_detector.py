@@ -0,0 +1,145 @@
+import json
+import os
+import time
+from functools import partial
+
+import numpy as np
+
+# Deterministic stand-in for the YOLO detector: no weights, no torch. Select it with
+# CROWD_DETECTOR_BACKEND=stub (or backend=stub on a route) to load-test the web app or benchmark
+# decode/encode/charting throughput on its own. It returns the same results[0].boxes.xyxy / .conf /
+# .cls / .id / .names structure as ultralytics, with track ids already assigned.
+STUB_LATENCY_MS = float(os.environ.get('CROWD_STUB_LATENCY_MS', 20.0))       # simulated forward pass per call
+STUB_PER_IMAGE_MS = float(os.environ.get('CROWD_STUB_PER_IMAGE_MS', 2.0))    # added per extra image in a batch
+STUB_PEOPLE = int(os.environ.get('CROWD_STUB_PEOPLE', 12))
+STUB_SEED = int(os.environ.get('CROWD_STUB_SEED', 0))
+STUB_SCRIPT = os.environ.get('CROWD_STUB_SCRIPT')     # JSON: [[[x1, y1, x2, y2, id], ...] per frame], played in a loop
+STUB_LIFETIME = 150     # frames before a synthetic walker leaves and a new one (new id) takes its place
+
+
+class _Array:
+    # numpy array with the torch-tensor calls the app makes on results (.cpu().numpy(), indexing)
+    def __init__(self, values):
+        self.values = values
+
+    def cpu(self):
+        return self
+
+    def numpy(self):
+        return self.values
+
+    def __getitem__(self, i):
+        return self.values[i]
+
+    def __len__(self):
+        return len(self.values)
+
+
+class StubBoxes:
+    def __init__(self, xyxy, conf, ids):
+        self.xyxy = _Array(np.asarray(xyxy, dtype=np.float32).reshape(-1, 4))
+        self.conf = _Array(np.asarray(conf, dtype=np.float32))
+        self.cls = _Array(np.zeros(len(self.conf), dtype=np.float32))       # every box is a person
+        self.id = _Array(np.asarray(ids, dtype=np.float32))
+
+    def __len__(self):
+        return len(self.conf)
+
+    def __iter__(self):
+        # Per-box views, as iterating an ultralytics Boxes gives
+        for i in range(len(self)):
+            yield StubBoxes(self.xyxy.values[i:i + 1], self.conf.values[i:i + 1], self.id.values[i:i + 1])
+
+
+class StubResults:
+    def __init__(self, boxes, shape, timeline=None):
+        self.boxes = boxes
+        self.names = {0: 'person'}
+        self.orig_shape = shape
+        self._timeline = timeline
+
+    def at(self, t):
+        # The same detection at frame t of a stream (tracking.StreamTracker passes its frame index)
+        return self._timeline(t)
+
+
+class _StubClock:
+    # Frame counter of model.track(); lives on model.predictor.trackers like ultralytics' tracker
+    # state, so batch_analysis._reset_tracker restarts it for every segment
+    def __init__(self):
+        self.frame = 0
+
+    def tick(self):
+        self.frame += 1
+        return self.frame - 1
+
+    def reset(self):
+        self.frame = 0
+
+
+class _StubPredictor:
+    def __init__(self):
+        self.trackers = [_StubClock()]
+
+
+class StubDetector:
+    # Frame t of a stream gives either the scripted frame t % len(script) or STUB_PEOPLE synthetic
+    # walkers bouncing around the frame at time t. The detector itself keeps no stream state, so
+    # streams can share and batch on one instance: predict() answers for t = 0 and the stream's own
+    # tracker moves the result to its frame index with results.at(t). track() counts its own frames.
+    # Either way the boxes depend only on (stream, frame index), never on warm-up or other streams.
+
+    def __init__(self, latency_ms=STUB_LATENCY_MS, per_image_ms=STUB_PER_IMAGE_MS, people=STUB_PEOPLE,
+                 seed=STUB_SEED, script=STUB_SCRIPT):
+        self.latency = latency_ms / 1000.0
+        self.per_image = per_image_ms / 1000.0
+        self.people = people
+        self.script = None
+        if script:
+            with open(script) as f:
+                self.script = [np.asarray(frame, dtype=np.float32).reshape(-1, 5) for frame in json.load(f)]
+        rng = np.random.default_rng(seed)
+        self._start = rng.random((people, 2))                  # position as a fraction of the frame
+        self._velocity = rng.uniform(-4.0, 4.0, (people, 2))   # pixels per frame
+        self._width = rng.uniform(30.0, 70.0, people)
+        self._conf = rng.uniform(0.4, 0.95, people)
+        self._phase = rng.integers(0, STUB_LIFETIME, people)   # walkers leave at different times
+        self.predictor = _StubPredictor()
+
+    def _walkers(self, t, height, width):
+        w = self._width
+        h = w * 2.2
+        span = np.stack([np.maximum(width - w, 1), np.maximum(height - h, 1)], axis=1)
+        # Triangle wave: walkers bounce off the frame edges instead of wrapping around
+        travel = self._start * span + self._velocity * t
+        pos = np.abs((travel + span) % (2 * span) - span)
+        xyxy = np.stack([pos[:, 0], pos[:, 1], pos[:, 0] + w, pos[:, 1] + h], axis=1)
+        generation = (t + self._phase) // STUB_LIFETIME
+        ids = np.arange(1, self.people + 1) + self.people * generation
+        return xyxy, self._conf, ids
+
+    def _result(self, height, width, conf, t):
+        if self.script is not None:
+            rows = self.script[t % len(self.script)]
+            xyxy, scores, ids = rows[:, :4], np.full(len(rows), 0.9, dtype=np.float32), rows[:, 4]
+        else:
+            xyxy, scores, ids = self._walkers(t, height, width)
+        keep = scores >= conf
+        return StubResults(StubBoxes(xyxy[keep], scores[keep], ids[keep]), (height, width),
+                           partial(self._result, height, width, conf))
+
+    def _run(self, source, conf, t):
+        images = source if isinstance(source, (list, tuple)) else [source]
+        time.sleep(self.latency + self.per_image * (len(images) - 1))   # releases the GIL like a real forward pass
+        return [self._result(*image.shape[:2], conf, t) for image in images]
+
+    def __call__(self, source, classes=None, conf=0.25, verbose=False, **kwargs):
+        return self._run(source, conf, 0)
+
+    predict = __call__
+
+    def track(self, source, persist=True, classes=None, conf=0.25, verbose=False, **kwargs):
+        clock = self.predictor.trackers[0]
+        if not persist:
+            clock.reset()
+        return self._run(source, conf, clock.tick())
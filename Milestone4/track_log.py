@@ -0,0 +1,128 @@
+import json
+import os
+import threading
+
+import numpy as np
+
+import result_cache
+
+TRACK_LOG_DIR = 'cache/tracks'
+
+_digests = {}       # (path, size, mtime) -> sha256, so a replayed video is hashed only once per process
+_digests_lock = threading.Lock()
+
+
+def video_digest(video_path):
+    stat = os.stat(video_path)
+    memo_key = (os.path.abspath(video_path), stat.st_size, stat.st_mtime)
+    with _digests_lock:
+        digest = _digests.get(memo_key)
+    if digest is None:
+        digest = result_cache.file_digest(video_path)
+        with _digests_lock:
+            _digests[memo_key] = digest
+    return digest
+
+
+def log_path(video_path, config):
+    key = result_cache.make_key(video_digest(video_path), config)
+    return os.path.join(TRACK_LOG_DIR, key + '.npz')
+
+
+class TrackLogWriter:
+    # Collects per-frame tracks while a video streams and saves them as one compressed, columnar
+    # .npz: frame offsets into flat id/box/zone columns, plus each frame's media timestamp.
+
+    def __init__(self, path, config):
+        self.path = path
+        self.config = config
+        self._index = []
+        self._pts = []
+        self._counts = []
+        self._ids = []
+        self._boxes = []
+        self._zones = []
+        self._layouts = set()
+
+    def append(self, index, pts, ids, boxes, zones, layout_signature):
+        self._layouts.add(layout_signature)
+        self._index.append(index)
+        self._pts.append(pts)
+        self._counts.append(len(ids))
+        if len(ids):
+            self._ids.append(np.asarray(ids, dtype=np.int32))
+            self._boxes.append(np.asarray(boxes, dtype=np.int16).reshape(-1, 4))
+            self._zones.append(np.asarray(zones, dtype=np.int8))
+
+    def complete(self):
+        # Only a log that covers every frame may later stand in for inference
+        return bool(self._index) and self._index == list(range(len(self._index)))
+
+    def save(self):
+        if not self.complete():
+            return False
+        os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        offsets = np.zeros(len(self._counts) + 1, dtype=np.int64)
+        np.cumsum(self._counts, out=offsets[1:])
+        tmp = self.path + '.tmp.npz'
+        np.savez_compressed(
+            tmp,
+            offsets=offsets,
+            pts=np.asarray(self._pts, dtype=np.float64),
+            ids=np.concatenate(self._ids) if self._ids else np.zeros(0, dtype=np.int32),
+            boxes=np.concatenate(self._boxes) if self._boxes else np.zeros((0, 4), dtype=np.int16),
+            zones=np.concatenate(self._zones) if self._zones else np.zeros(0, dtype=np.int8),
+            config=np.frombuffer(json.dumps(self.config, sort_keys=True).encode(), dtype=np.uint8),
+            # Zone labels are only trusted later if one layout was active for the whole video
+            layout=np.frombuffer((next(iter(self._layouts)) if len(self._layouts) == 1 else '').encode(), dtype=np.uint8),
+        )
+        os.replace(tmp, self.path)
+        return True
+
+
+class TrackLog:
+    def __init__(self, path):
+        with np.load(path) as data:
+            self.offsets = data['offsets']
+            self.pts = data['pts']
+            self.ids = data['ids']
+            self.boxes = data['boxes']
+            self.zones = data['zones']
+            self.layout = data['layout'].tobytes().decode() if 'layout' in data else ''
+            config = json.loads(data['config'].tobytes().decode()) if 'config' in data else {}
+        self.size = tuple(config.get('size', (1024, 576)))      # frame size the boxes are in
+
+    def __len__(self):
+        return len(self.pts)
+
+    def frame(self, index):
+        start, end = self.offsets[index], self.offsets[index + 1]
+        return self.ids[start:end].astype(int), self.boxes[start:end].astype(int), self.zones[start:end]
+
+    def zone_labels(self, layout):
+        # Recorded labels if they were made with this layout, else re-assigned from the boxes in one gather
+        if self.layout == layout.signature():
+            return self.zones.astype(np.int64)
+        return layout.assign(layout.centers(self.boxes))
+
+    def zone_series(self, layout):
+        # Per-frame people count for each zone, without touching individual frames
+        frame_of_box = np.repeat(np.arange(len(self)), np.diff(self.offsets))
+        return layout.series(frame_of_box, self.zone_labels(layout), len(self))
+
+    def centers(self, layout):
+        # Box centres split into the first polygon zone and everything else (heatmap colours)
+        centers = layout.centers(self.boxes)
+        labels = self.zone_labels(layout)
+        return centers[labels == 1].tolist(), centers[labels != 1].tolist()
+
+    def unique_count(self):
+        return int(len(np.unique(self.ids)))
+
+    def timestamps(self):
+        return [f'{pts:.3f}' for pts in self.pts]
+
+
+def load(video_path, config):
+    path = log_path(video_path, config)
+    return TrackLog(path) if os.path.exists(path) else None
@@ -0,0 +1,46 @@
+import numpy as np
+
+TRACKER_CONFIG = 'bytetrack.yaml'
+TRACKER_FRAME_RATE = 30         # what ultralytics' own model.track() assumes
+
+_args = {}
+
+
+def _tracker_args(config):
+    # Parsed once; the same settings model.track(tracker="bytetrack.yaml") would use
+    if config not in _args:
+        from ultralytics.utils import IterableSimpleNamespace, yaml_load
+        from ultralytics.utils.checks import check_yaml
+        _args[config] = IterableSimpleNamespace(**yaml_load(check_yaml(config)))
+    return _args[config]
+
+
+class StreamTracker:
+    # One ByteTrack instance per stream. The detector only predicts, so a model replica can serve
+    # any stream, while track ids and lost-track buffers never leak between streams.
+
+    def __init__(self, config=TRACKER_CONFIG, frame_rate=TRACKER_FRAME_RATE):
+        self.config = config
+        self.frame_rate = frame_rate
+        self._tracker = None        # built on the first frame that needs association
+
+    def update(self, result, frame, index=None):
+        # result: one ultralytics Results from model.predict(); returns (ids, xyxy boxes) as int arrays.
+        # index: the frame's position in this stream (decoded frames, including ones never detected)
+        if result.boxes.id is not None:
+            # The detector already assigned ids (the stub backend): nothing to associate, but its
+            # synthetic people move with this stream's frame index, not with the shared detector
+            if hasattr(result, 'at') and index is not None:
+                result = result.at(index)
+            return result.boxes.id.cpu().numpy().astype(int), result.boxes.xyxy.cpu().numpy().astype(int)
+        if self._tracker is None:
+            from ultralytics.trackers.byte_tracker import BYTETracker
+            self._tracker = BYTETracker(args=_tracker_args(self.config), frame_rate=self.frame_rate)
+        tracks = self._tracker.update(result.boxes.cpu().numpy(), frame)
+        if len(tracks) == 0:
+            return np.zeros(0, dtype=int), np.zeros((0, 4), dtype=int)
+        return tracks[:, 4].astype(int), tracks[:, :4].astype(int)
+
+    def reset(self):
+        if self._tracker is not None:
+            self._tracker.reset()
@@ -1,17 +1,53 @@
+import os
+import time
+from functools import partial
 import cv2     # OpenCV library for image/video processing.  
-from ultralytics import YOLO     #detection model. 
-
-# Load YOLO model
-model = YOLO('yolov8n.pt')       #'yolov8n.pt' is the pretrained 'nano' version
-
-_video_unique_ids = {}
-_video_in_zone_ids = {}
-_video_stop_flags = {}
-
+import model_registry     #pooled, lazily loaded detector replicas (torch/ONNX/OpenVINO backend)
+from pipeline import run_pipeline, OVERFLOW_BLOCK
+from stride import AdaptiveStride
+from motion_gate import MotionGate
+import numpy as np
+import detector_backends
+import track_log
+import zones
+import sessions
+import scheduler
+from tracking import StreamTracker
+from live_capture import LatestFrameGrabber
+from heatmap import DensityHeatmap
+import count_store
+import metrics
+from metrics import stage_timer
+from zone_history import now_ms
+
+# Legacy single-rectangle zone, still used by detect_crowd_in_zone; streams use zones.get_layout()
 ZONE_X1, ZONE_Y1 = 700, 0
 ZONE_X2, ZONE_Y2 = 1024, 576
 ZONE_THRESHOLD = 10
 
+# Staged decode -> detect/track -> annotate/encode pipeline for uploaded videos.
+# OVERFLOW_BLOCK keeps every frame (backpressure); OVERFLOW_DROP skips stale frames to stay real time.
+PIPELINE_ENABLED = True
+PIPELINE_QUEUE_SIZE = 4
+PIPELINE_OVERFLOW = OVERFLOW_BLOCK
+
+# Adaptive detection stride: run the detector every N frames (1..ADAPTIVE_STRIDE_MAX) and
+# extrapolate track boxes on the frames in between
+ADAPTIVE_STRIDE_ENABLED = False
+ADAPTIVE_STRIDE_MAX = 6
+
+# Motion gate: skip the detector on frames that barely differ from the last detected one
+MOTION_GATE_ENABLED = True
+
+# Per-video track log: a finished stream saves every frame's tracks so replays skip inference
+TRACK_LOG_ENABLED = True
+
+# Cross-stream micro-batching: frames from all running streams share forward passes (scheduler.py)
+BATCH_SCHEDULER_ENABLED = True
+
+# Durable zone counts in SQLite (count_store.py), written by a background thread
+COUNT_STORE_ENABLED = True
+
 def put_text_rect(frame, text, pos, scale=1, thickness=2, color=(255,255,255), bg_color=(0,0,0)):
     font = cv2.FONT_HERSHEY_SIMPLEX
     text_size, _ = cv2.getTextSize(text, font, scale, thickness)
@@ -23,72 +59,205 @@ def put_text_rect(frame, text, pos, scale=1, thickness=2, color=(255,255,255), b
 
 
 
-def stream_video_with_data(video_path):
-    cap = cv2.VideoCapture(video_path)
-    _video_unique_ids.setdefault(video_path, set())
-    _video_in_zone_ids.setdefault(video_path, set())
-    _video_stop_flags[video_path] = False
-
-    while True:
-        if _video_stop_flags.get(video_path, False):
-            break
-        ret, frame = cap.read()
-        if not ret:
-            break
-
-        frame = cv2.resize(frame, (1024, 576))
-        results = model.track(frame, persist=True, classes=[0], tracker="bytetrack.yaml", conf=0.25)
-
-        ids_in_zone1 = set()
-        ids_in_zone2 = set()
-        centers_zone1 = []
-        centers_zone2 = []
-
-        if results[0].boxes.id is not None:
-            ids = results[0].boxes.id.cpu().numpy().astype(int)
-            boxes = results[0].boxes.xyxy.cpu().numpy().astype(int)
-            for track_id, box in zip(ids, boxes):
-                x1, y1, x2, y2 = box
-                cx = int((x1 + x2) / 2)
-                cy = int((y1 + y2) / 2)
-                _video_unique_ids[video_path].add(track_id)
-
-                if ZONE_X1 <= cx <= ZONE_X2 and ZONE_Y1 <= cy <= ZONE_Y2:
-                    ids_in_zone1.add(track_id)
-                    centers_zone1.append((cx, cy))
-                    cv2.rectangle(frame, (x1, y1), (x2, y2), (0, 255, 255), 2)
-                else:
-                    ids_in_zone2.add(track_id)
-                    centers_zone2.append((cx, cy))
-                    cv2.rectangle(frame, (x1, y1), (x2, y2), (255, 0, 255), 2)
-                put_text_rect(frame, f'{track_id}', (x1, y1), 1, 1)
+def _record_counts(session, zone_counts):
+    ts = now_ms()
+    session.history.append(zone_counts, ts)
+    if COUNT_STORE_ENABLED:
+        count_store.get_store().record(session.source, zone_counts, ts)     # enqueue only, never blocks
+
+
+def _new_motion_gate(session, enabled=None):
+    if enabled is None:
+        enabled = MOTION_GATE_ENABLED
+    session.gate = MotionGate() if enabled else None
+    return session.gate
+
+
+def _read_frames(session, video_path):
+    # Decode stage: yields resized frames until the video ends or the session is stopped
+    cap = session.capture(cv2.VideoCapture(video_path))
+    index = 0
+    try:
+        while not session.stopped:
+            with stage_timer('decode', 'video'):
+                ret, frame = session.read(cap)
+            if not ret:
+                break
+            pts = cap.get(cv2.CAP_PROP_POS_MSEC) / 1000.0
+            with stage_timer('resize', 'video'):
+                frame = cv2.resize(frame, (1024, 576))
+            yield {'frame': frame, 'index': index, 'pts': pts}
+            index += 1
+    finally:
+        cap.release()
+
+
+def _replay_tracks(log, packet):
+    # Detect/track stage when a track log exists: read the recorded tracks instead of running YOLO
+    if packet['index'] < len(log):
+        packet['ids'], packet['boxes'], _ = log.frame(packet['index'])
+    else:
+        packet['ids'], packet['boxes'] = [], []
+    packet['detected'] = False
+    return packet
+
+
+def _detect_direct(backend, frame):
+    with model_registry.lease(backend) as model:
+        started = time.perf_counter()
+        result = model.predict(frame, classes=[0], conf=0.25, verbose=False)[0]
+    metrics.observe_model(backend or detector_backends.DETECTOR_BACKEND, time.perf_counter() - started)
+    return result
+
+
+def _open_detector(session, backend):
+    # frame -> one ultralytics Results, either batched with other streams or on a leased replica
+    if BATCH_SCHEDULER_ENABLED:
+        client = scheduler.get_scheduler(backend).attach()
+        session.on_close(client.close)
+        return client.detect
+    return partial(_detect_direct, backend)
+
+
+def _track_people(detect, tracker, stride, gate, packet, kind='video'):
+    # Detect/track stage: adds track ids and boxes (as int arrays) to the frame packet.
+    # Detection is shared (scheduler or pooled replica); tracking uses this stream's own tracker.
+    static = False
+    if gate is not None:
+        with stage_timer('motion_gate', kind):
+            static = gate.is_static(packet['frame'])
+    if static:
+        # Nothing moved since the last detection: reuse the previous frame's boxes as they are
+        packet['ids'], packet['boxes'] = gate.last
+        packet['detected'] = False
+        return packet
+
+    if stride is not None and not stride.due():
+        packet['ids'], packet['boxes'] = stride.carry()
+        packet['detected'] = False
+    else:
+        with stage_timer('detect', kind):       # includes waiting for a batch slot or a free replica
+            result = detect(packet['frame'])
+        with stage_timer('track', kind):
+            packet['ids'], packet['boxes'] = tracker.update(result, packet['frame'], packet.get('index'))
+        packet['detected'] = True
+        if stride is not None:
+            stride.observe(packet['ids'], packet['boxes'])
+
+    if gate is not None:
+        gate.remember(packet['ids'], packet['boxes'])
+    return packet
+
+
+def _annotate_and_encode(session, writer, packet):
+    # Annotate/encode stage: zone assignment, drawing and JPEG encoding
+    frame = packet['frame']
+    with stage_timer('zones', 'video'):
+        layout = zones.get_layout(session.source).for_size(frame.shape[1], frame.shape[0])
+        ids = np.asarray(packet['ids'], dtype=int).reshape(-1)
+        boxes = np.asarray(packet['boxes'], dtype=int).reshape(-1, 4)
+        centers = layout.centers(boxes)
+        labels = layout.assign(centers)          # one mask lookup for every person in the frame
+        totals = layout.count_labels(labels)
+        zone_counts = layout.counts(labels)
+
+    session.touch()
+    session.unique_ids.update(ids.tolist())
+    with stage_timer('heatmap', 'video'):      # heatmap accumulation plus history/count-store recording
+        session.heatmap.add(centers)
+        _record_counts(session, zone_counts)
+
+    with stage_timer('draw', 'video'):
+        for track_id, (x1, y1, x2, y2), label in zip(ids.tolist(), boxes.tolist(), labels.tolist()):
+            cv2.rectangle(frame, (x1, y1), (x2, y2), layout.colors[label], 2)
+            put_text_rect(frame, f'{track_id}', (x1, y1), 1, 1)
 
-        _video_in_zone_ids[video_path] = ids_in_zone1.union(ids_in_zone2)
-        cv2.rectangle(frame, (ZONE_X1, ZONE_Y1), (ZONE_X2, ZONE_Y2), (0, 0, 255), 3)
+        if writer is not None:
+            writer.append(packet['index'], packet['pts'], ids, boxes, labels, layout.signature())
 
-        count_zone1 = len(ids_in_zone1)
-        count_zone2 = len(ids_in_zone2)
-        #total_unique_count = len(_video_unique_ids[video_path])
+        session.in_zone_ids = set(ids.tolist())
+        layout.draw(frame)
 
-        put_text_rect(frame, f'Zone 1: {count_zone1}', (30, 40), 2, 2)
-        put_text_rect(frame, f'Zone 2: {count_zone2}', (30, 80), 2, 2)
-       # put_text_rect(frame, f'Total: {total_unique_count}', (30, 120), 2, 2)
+        for i, (name, count) in enumerate(zone_counts.items()):
+            put_text_rect(frame, f'{name}: {count}', (30, 40 + 40 * i), 2, 2)
 
-        if count_zone1 > ZONE_THRESHOLD:
+        if any(limit is not None and totals[label] > limit for label, limit in enumerate(layout.thresholds)):
             out_h, out_w = frame.shape[:2]
             put_text_rect(frame, "ALERT: Count Exceeded!", (int(out_w*0.3), out_h - 30), 2, 2, color=(0,0,255), bg_color=(255,255,255))
 
+    with stage_timer('encode', 'video'):
         ret, buffer = cv2.imencode('.jpg', frame)
         frame_bytes = buffer.tobytes()
 
-        yield frame_bytes, {
-            'centers_zone1': centers_zone1,
-            'centers_zone2': centers_zone2,
-            'zone_counts': {'Zone 1': count_zone1, 'Zone 2': count_zone2},
-          #  'total_count': total_unique_count
-        }
-
-    cap.release()
+    # centers_zone1 is the first polygon zone, centers_zone2 everything else (heatmap colours)
+    return frame_bytes, {
+        'centers_zone1': [tuple(c) for c in centers[labels == 1].tolist()],
+        'centers_zone2': [tuple(c) for c in centers[labels != 1].tolist()],
+        'zone_counts': zone_counts,
+        'detected': packet.get('detected', True),
+        'replayed': writer is None and TRACK_LOG_ENABLED,
+        'gate_hit_rate': session.gate.stats()['hit_rate'] if session.gate is not None else 0.0,
+    }
+
+
+def track_log_config(backend=None, adaptive_stride=None, motion_gate=None):
+    # Everything that changes the recorded tracks; a log is reused only for an identical setup.
+    # Zone layouts are not part of it: zone membership is recomputed from the boxes if zones change.
+    return {
+        'backend': backend or detector_backends.DETECTOR_BACKEND,
+        'size': [1024, 576],
+        'format': 2,
+        'stride': ADAPTIVE_STRIDE_MAX if (ADAPTIVE_STRIDE_ENABLED if adaptive_stride is None else adaptive_stride) else 1,
+        'motion_gate': MOTION_GATE_ENABLED if motion_gate is None else motion_gate,
+    }
+
+
+def get_track_log(video_path, backend=None, adaptive_stride=None, motion_gate=None):
+    return track_log.load(video_path, track_log_config(backend, adaptive_stride, motion_gate))
+
+
+def stream_video_with_data(video_path, pipelined=None, overflow=None, adaptive_stride=None, motion_gate=None, backend=None):
+    # Each call is its own session: its counters and stop handle are not shared with other streams
+    session = sessions.get_manager().open(video_path)
+    try:
+        yield from _stream_session(session, video_path, pipelined, overflow, adaptive_stride, motion_gate, backend)
+    finally:
+        session.close()
+
+
+def _stream_session(session, video_path, pipelined, overflow, adaptive_stride, motion_gate, backend):
+    session.heatmap = DensityHeatmap()
+    config = track_log_config(backend, adaptive_stride, motion_gate)
+    recorded = track_log.load(video_path, config) if TRACK_LOG_ENABLED else None
+    writer = None
+    if recorded is not None:
+        track = partial(_replay_tracks, recorded)
+    else:
+        if adaptive_stride is None:
+            adaptive_stride = ADAPTIVE_STRIDE_ENABLED
+        stride = session.stride = AdaptiveStride(max_stride=ADAPTIVE_STRIDE_MAX) if adaptive_stride else None
+        gate = _new_motion_gate(session, motion_gate)
+        session.tracker = StreamTracker()
+        track = partial(_track_people, _open_detector(session, backend), session.tracker, stride, gate)
+        if TRACK_LOG_ENABLED:
+            writer = track_log.TrackLogWriter(track_log.log_path(video_path, config), config)
+
+    frames = _read_frames(session, video_path)
+    annotate = partial(_annotate_and_encode, session, writer)
+
+    if pipelined is None:
+        pipelined = PIPELINE_ENABLED
+    if not pipelined:
+        outputs = (annotate(track(packet)) for packet in frames)
+    else:
+        # Decode, detect/track and annotate/encode each run on their own thread so they overlap
+        outputs = run_pipeline(frames, [track, annotate], queue_size=PIPELINE_QUEUE_SIZE,
+                               overflow=overflow or PIPELINE_OVERFLOW, name=f'video-{os.path.basename(video_path)}')
+    yield from outputs
+
+    # Reached only when the video played to the end (not stopped, client still connected)
+    if writer is not None and not session.stopped:
+        writer.save()
 
 
 def detect_crowd_in_zone(image_path):
@@ -98,7 +267,8 @@ def detect_crowd_in_zone(image_path):
     centers_zone1 = []
     centers_zone2 = []
 
-    results = model(frame, classes=[0])
+    with model_registry.lease() as model:
+        results = model(frame, classes=[0])
 
     if results[0].boxes.id is not None:
         ids = results[0].boxes.id.cpu().numpy().astype(int)
@@ -127,93 +297,111 @@ def detect_crowd_in_zone(image_path):
 
 
 
-def stop_stream(source="webcam"):
-    _video_stop_flags[source] = True
-
-def get_unique_count(source):
-    return len(_video_unique_ids.get(source, set()))
-
-def get_zone_count(source):
-    return len(_video_in_zone_ids.get(source, set()))
+def get_latency_stats(source="webcam"):
+    session = sessions.get_manager().latest(source)
+    return session.latency_stats() if session is not None else {'samples': 0}
 
 
+def get_motion_gate_stats(source):
+    session = sessions.get_manager().latest(source)
+    gate = session.gate if session is not None else None
+    return gate.stats() if gate is not None else {'checks': 0, 'skipped': 0, 'hit_rate': 0.0}
 
 
 
-def generate_live_frames():
-    cap = cv2.VideoCapture(0)  # Default webcam
 
-    # Reset unique IDs and in-zone IDs at the start of streaming
-    _video_unique_ids["webcam"] = set()
-    _video_in_zone_ids["webcam"] = set()
-    _video_stop_flags["webcam"] = False
 
-    while True:
-        if _video_stop_flags.get("webcam", False):
-            break
-        ret, frame = cap.read()
-        if not ret:
-            break
+_capture_to_jpeg = metrics.histogram('crowd_webcam_latency_seconds', 'Webcam capture to encoded JPEG')
 
-        frame = cv2.resize(frame, (1024, 576))
 
-        results = model(frame, classes=[0])  # Detect people class only
+def generate_live_frames(backend=None):
+    session = sessions.get_manager().open("webcam")
+    try:
+        yield from _live_session(session, backend)
+    finally:
+        session.close()
 
-        ids_in_zone = set()
-        _video_unique_ids["webcam"] = set()  # Clear IDs before this frame's detections
-        centers_zone1 = []
-        centers_zone2 = []
 
-        if results[0].boxes.xyxy is not None:
-            boxes = results[0].boxes.xyxy.cpu().numpy().astype(int)
-            for idx, box in enumerate(boxes):
-                x1, y1, x2, y2 = box
-                cx = int((x1 + x2) / 2)
-                cy = int((y1 + y2) / 2)
-                track_id = f'frame_{idx}'
-
-                _video_unique_ids["webcam"].add(track_id)
-
-                if ZONE_X1 <= cx <= ZONE_X2 and ZONE_Y1 <= cy <= ZONE_Y2:
-                    ids_in_zone.add(track_id)
-                    centers_zone1.append((cx, cy))
-                    cv2.rectangle(frame, (x1, y1), (x2, y2), (0, 255, 255), 2)  # Cyan bounding box
-                else:
-                    centers_zone2.append((cx, cy))
-                    cv2.rectangle(frame, (x1, y1), (x2, y2), (255, 0, 255), 2)  # Magenta bounding box
+def _live_session(session, backend):
+    session.heatmap = DensityHeatmap()
+    gate = _new_motion_gate(session)
+    session.tracker = StreamTracker()
+    # Same detect -> per-stream tracker path as uploaded videos (no adaptive stride on a live feed)
+    track = partial(_track_people, _open_detector(session, backend), session.tracker, None, gate, kind='webcam')
+    grabber = LatestFrameGrabber(session, 0)  # Default webcam, read on its own thread
 
+    while not session.stopped:
+        latest = grabber.latest()
+        if latest is None:
+            break
+        index, frame, captured_at = latest
+
+        with stage_timer('resize', 'webcam'):
+            frame = cv2.resize(frame, (1024, 576))
+        packet = track({'frame': frame, 'index': index, 'pts': captured_at})
+        frame = packet['frame']
+        ids = np.asarray(packet['ids'], dtype=int).reshape(-1)
+        boxes = np.asarray(packet['boxes'], dtype=int).reshape(-1, 4)
+
+        with stage_timer('zones', 'webcam'):
+            layout = zones.get_layout("webcam").for_size(frame.shape[1], frame.shape[0])
+            centers = layout.centers(boxes)
+            labels = layout.assign(centers)
+            zone_counts = layout.counts(labels)
+
+        session.touch()
+        session.dropped_frames = grabber.dropped
+        session.unique_ids.update(ids.tolist())
+        session.in_zone_ids = set(ids[labels == 1].tolist())
+        with stage_timer('heatmap', 'webcam'):
+            session.heatmap.add(centers)
+            _record_counts(session, zone_counts)
+
+        with stage_timer('draw', 'webcam'):
+            for track_id, (x1, y1, x2, y2), label in zip(ids.tolist(), boxes.tolist(), labels.tolist()):
+                cv2.rectangle(frame, (x1, y1), (x2, y2), layout.colors[label], 2)
                 put_text_rect(frame, f'{track_id}', (x1, y1), 1, 1)
 
-            _video_in_zone_ids["webcam"] = ids_in_zone
-        else:
-            # No detections in this frame, clear sets to show zero count
-            _video_unique_ids["webcam"] = set()
-            _video_in_zone_ids["webcam"] = set()
-
-        # Draw zone rectangle
-        cv2.rectangle(frame, (ZONE_X1, ZONE_Y1), (ZONE_X2, ZONE_Y2), (0, 0, 255), 3)  # Red zone boundary
-
-        count_zone1 = len(ids_in_zone)
-        total_unique_count = len(_video_unique_ids["webcam"])
-
-        put_text_rect(frame, f'Zone 1: {count_zone1}', (30, 40), 2, 2)
-        put_text_rect(frame, f'Total: {total_unique_count}', (30, 90), 2, 2)
-
-        ret, buffer = cv2.imencode('.jpg', frame)
-        frame_bytes = buffer.tobytes()
-
-        yield (b'--frame\r\nContent-Type: image/jpeg\r\n\r\n' + frame_bytes + b'\r\n')
-
-    cap.release()
+            # Draw zone outlines
+            layout.draw(frame)
+
+            total_unique_count = len(session.unique_ids)
+
+            for i, (name, count) in enumerate(zone_counts.items()):
+                if i == len(zone_counts) - 1:
+                    break       # the outside zone is not shown on the live view
+                put_text_rect(frame, f'{name}: {count}', (30, 40 + 50 * i), 2, 2)
+            put_text_rect(frame, f'Total: {total_unique_count}', (30, 40 + 50 * (len(zone_counts) - 1)), 2, 2)
+
+        with stage_timer('encode', 'webcam'):
+            ret, buffer = cv2.imencode('.jpg', frame)
+            frame_bytes = buffer.tobytes()
+
+        # Capture -> encoded JPEG; what the viewer sees adds only network and display time
+        latency_ms = (time.perf_counter() - captured_at) * 1000.0
+        session.record_latency(latency_ms)
+        _capture_to_jpeg.observe(latency_ms / 1000.0)
+
+        data = {
+            'centers_zone1': centers[labels == 1].tolist(),
+            'centers_zone2': centers[labels != 1].tolist(),
+            'zone_counts': zone_counts,
+            'detected': packet['detected'],
+            'latency_ms': round(latency_ms, 1),
+            'frames_dropped': grabber.dropped,
+        }
+        yield frame_bytes, data
 
 
 def stop_stream(source="webcam"):
-    _video_stop_flags[source] = True
+    sessions.get_manager().stop(source)
 
 
 def get_unique_count(source="webcam"):
-    return len(_video_unique_ids.get(source, set()))
+    session = sessions.get_manager().latest(source)
+    return len(session.unique_ids) if session is not None else 0
 
 
 def get_zone_count(source="webcam"):
-    return len(_video_in_zone_ids.get(source, set()))
+    session = sessions.get_manager().latest(source)
+    return len(session.in_zone_ids) if session is not None else 0
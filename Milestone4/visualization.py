@@ -6,15 +6,12 @@ from io import BytesIO      #For encoding binary image data as string (great for
 import pandas as pd
 
 def create_zone_barchart_and_csv(zone_history, timestamps, csv_filename="static/zone_counts.csv"):
-    area1 = [v for v in zone_history.get('Zone 1', [])]
-    area2 = [v for v in zone_history.get('Zone 2', [])]
-    zone_labels = ['Zone1', 'Zone2']
-    total_counts = [
-        area1[-1] if area1 else 0,
-        area2[-1] if area2 else 0
-    ]
+    areas = [list(v) for v in zone_history.values()]      # one series per zone, in layout order
+    zone_labels = [name.replace(' ', '') for name in zone_history]
+    total_counts = [area[-1] if area else 0 for area in areas]
+    palette = ['#1976d2', '#00bfae', '#f9a825', '#e53935', '#8e24aa', '#43a047']
     fig, ax = plt.subplots(figsize=(7, 4))
-    bars = ax.bar(zone_labels, total_counts, color=['#1976d2', '#00bfae'], width=0.5)
+    bars = ax.bar(zone_labels, total_counts, color=[palette[i % len(palette)] for i in range(len(areas))], width=0.5)
     ax.set_ylabel('Count')
     ax.set_xlabel('Area')
     ax.set_title('Zone Occupancy')
@@ -30,14 +27,19 @@ def create_zone_barchart_and_csv(zone_history, timestamps, csv_filename="static/
     bar_chart_img = base64.b64encode(buf.read()).decode('utf-8')
     plt.close(fig)
 
-    df = pd.DataFrame({
-        'area1count': area1,
-        'area2count': area2,
-        'timestamp': timestamps
-    })
-    df.to_csv(csv_filename, index=False)
+    if csv_filename is not None:
+        zone_counts_frame(zone_history, timestamps).to_csv(csv_filename, index=False)
     return bar_chart_img, csv_filename
 
+def zone_counts_frame(zone_history, timestamps):
+    columns = {f'area{i}count': list(area) for i, area in enumerate(zone_history.values(), 1)}
+    columns['timestamp'] = timestamps
+    return pd.DataFrame(columns)
+
+def zone_counts_csv(zone_history, timestamps):
+    # Same columns as the CSV file above, as text (nothing written to disk)
+    return zone_counts_frame(zone_history, timestamps).to_csv(index=False)
+
 def create_population_line_chart(zone_history):
     zone_names = list(zone_history.keys())
     time_points = list(range(len(next(iter(zone_history.values())))))
@@ -76,10 +78,16 @@ def save_heatmap_image(points_zone1, points_zone2, filename="static/heatmap.png"
     ax.tick_params(colors='white')
     ax.legend(frameon=False, fontsize=13)
     plt.tight_layout()
-    plt.savefig(filename, bbox_inches='tight', transparent=False)
+    plt.savefig(filename, bbox_inches='tight', transparent=False, format='png')
     plt.close(fig)
 
+def create_heatmap_image(points_zone1, points_zone2):
+    # The heatmap above as a base64 PNG, like the charts (no shared static/heatmap.png between requests)
+    buf = BytesIO()
+    save_heatmap_image(points_zone1, points_zone2, filename=buf)
+    return base64.b64encode(buf.getvalue()).decode('utf-8')
+
 def create_population_charts(zone_history, timestamps):
-    bar_chart_img, _ = create_zone_barchart_and_csv(zone_history, timestamps)
+    bar_chart_img, _ = create_zone_barchart_and_csv(zone_history, timestamps, csv_filename=None)     # charts only, no shared CSV file
     line_chart_img = create_population_line_chart(zone_history)
     return bar_chart_img, line_chart_img
@@ -1,8 +1,5 @@
 import cv2
-from ultralytics import YOLO
-
-# Load YOLO model
-model = YOLO('yolov8n.pt')
+from model_registry import get_model
 
 _video_unique_ids = {}
 _video_in_zone_ids = {}
@@ -24,6 +21,7 @@ def put_text_rect(frame, text, pos, scale=1, thickness=2, color=(255, 255, 255),
 
 
 def generate_live_frames():
+    model = get_model()
     cap = cv2.VideoCapture(0)  # Default webcam
 
     # Reset unique IDs and in-zone IDs at the start of streaming
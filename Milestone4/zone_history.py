@@ -0,0 +1,193 @@
+import threading
+import time
+from datetime import datetime, timezone
+
+import numpy as np
+
+# Retention per resolution. Each level is a fixed-size ring, so memory stays flat however long a
+# camera runs: recent frames at full rate, then per-second and per-minute aggregates.
+HISTORY_RAW_SECONDS = 300
+HISTORY_MAX_FPS = 30                    # sizes the raw ring: HISTORY_RAW_SECONDS * HISTORY_MAX_FPS rows
+HISTORY_SECOND_SECONDS = 3600
+HISTORY_MINUTE_SECONDS = 7 * 24 * 3600
+RESOLUTIONS = ('raw', 'second', 'minute')
+
+
+def now_ms():
+    return time.time_ns() // 1_000_000
+
+
+def iso(ts_ms):
+    return datetime.fromtimestamp(ts_ms / 1000.0, tz=timezone.utc).replace(tzinfo=None).isoformat()
+
+
+class _Ring:
+    # Columnar ring buffer: int64 epoch-ms timestamps plus one column per zone for mean and max
+    def __init__(self, capacity, width):
+        self.capacity = capacity
+        self.ts = np.zeros(capacity, dtype=np.int64)
+        self.mean = np.zeros((capacity, width), dtype=np.float32)
+        self.max = np.zeros((capacity, width), dtype=np.int32)
+        self.size = 0
+        self.head = 0           # next write position
+        self.wrapped = False
+
+    def widen(self, width):
+        extra = width - self.mean.shape[1]
+        if extra > 0:
+            self.mean = np.pad(self.mean, ((0, 0), (0, extra)))
+            self.max = np.pad(self.max, ((0, 0), (0, extra)))
+
+    def push(self, ts, mean, peak):
+        self.ts[self.head] = ts
+        self.mean[self.head] = mean
+        self.max[self.head] = peak
+        self.head = (self.head + 1) % self.capacity
+        if self.size == self.capacity:
+            self.wrapped = True
+        self.size = min(self.size + 1, self.capacity)
+
+    def ordered(self):
+        # Oldest-first views/copies of the live rows
+        if self.size < self.capacity:
+            rows = slice(0, self.size)
+            return self.ts[rows].copy(), self.mean[rows].copy(), self.max[rows].copy()
+        order = np.r_[self.head:self.capacity, 0:self.head]
+        return self.ts[order], self.mean[order], self.max[order]
+
+
+class _Bucket:
+    # Running sum/max/count of raw samples inside one second or minute
+    def __init__(self, width):
+        self.start = None
+        self.sum = np.zeros(width, dtype=np.int64)
+        self.max = np.zeros(width, dtype=np.int32)
+        self.n = 0
+
+    def widen(self, width):
+        extra = width - len(self.sum)
+        if extra > 0:
+            self.sum = np.pad(self.sum, (0, extra))
+            self.max = np.pad(self.max, (0, extra))
+
+    def add(self, start, counts):
+        self.start = start
+        self.sum += counts
+        np.maximum(self.max, counts, out=self.max)
+        self.n += 1
+
+    def flush(self, ring):
+        if self.n:
+            ring.push(self.start, self.sum / self.n, self.max)
+        self.sum[:] = 0
+        self.max[:] = 0
+        self.n = 0
+
+
+class ZoneHistory:
+    # Per-session zone-count time series for any number of named zones. A zone that appears later
+    # (layout hot-reload) gets a new column; earlier rows read 0 for it.
+
+    def __init__(self, raw_seconds=HISTORY_RAW_SECONDS, max_fps=HISTORY_MAX_FPS,
+                 second_seconds=HISTORY_SECOND_SECONDS, minute_seconds=HISTORY_MINUTE_SECONDS):
+        self.names = []
+        self._index = {}
+        self._lock = threading.Lock()
+        self._retention = {'raw': raw_seconds * 1000, 'second': second_seconds * 1000, 'minute': minute_seconds * 1000}
+        self._rings = {
+            'raw': _Ring(raw_seconds * max_fps, 0),
+            'second': _Ring(second_seconds, 0),
+            'minute': _Ring(minute_seconds // 60, 0),
+        }
+        self._buckets = {'second': (1000, _Bucket(0)), 'minute': (60_000, _Bucket(0))}
+        self.first_ts = None
+        self.last_ts = None
+
+    def __len__(self):
+        return self._rings['raw'].size
+
+    def _columns(self, names):
+        new = [name for name in names if name not in self._index]
+        if new:
+            for name in new:
+                self._index[name] = len(self.names)
+                self.names.append(name)
+            for ring in self._rings.values():
+                ring.widen(len(self.names))
+            for _, bucket in self._buckets.values():
+                bucket.widen(len(self.names))
+        return [self._index[name] for name in names]
+
+    def _append(self, names, counts, ts):
+        row = np.zeros(len(self.names), dtype=np.int32)
+        row[names] = counts
+        self._rings['raw'].push(ts, row, row)
+        for resolution, (width_ms, bucket) in self._buckets.items():
+            start = ts - ts % width_ms
+            if bucket.start is not None and start != bucket.start:
+                bucket.flush(self._rings[resolution])
+            bucket.add(start, row)
+        if self.first_ts is None:
+            self.first_ts = ts
+        self.last_ts = ts
+
+    def append(self, zone_counts, ts=None):
+        ts = now_ms() if ts is None else int(ts)
+        with self._lock:
+            columns = self._columns(list(zone_counts))
+            self._append(columns, list(zone_counts.values()), ts)
+
+    def extend(self, zone_series, timestamps_ms):
+        # Bulk load, e.g. a finished batch job: zone_series is {name: [count per frame]}
+        with self._lock:
+            columns = self._columns(list(zone_series))
+            grid = np.asarray(list(zone_series.values()), dtype=np.int32).reshape(len(columns), -1).T
+            for ts, counts in zip(timestamps_ms, grid):
+                self._append(columns, counts, int(ts))
+
+    def series(self, resolution='raw', since_ms=None):
+        # (timestamps ms, mean counts [rows, zones], max counts [rows, zones]) within retention,
+        # including the still-open second/minute bucket
+        with self._lock:
+            ts, mean, peak = self._rings[resolution].ordered()
+            if resolution in self._buckets:
+                _, bucket = self._buckets[resolution]
+                if bucket.n:
+                    ts = np.append(ts, bucket.start)
+                    mean = np.vstack([mean, bucket.sum / bucket.n])
+                    peak = np.vstack([peak, bucket.max])
+            latest = ts[-1] if len(ts) else 0
+        floor = latest - self._retention[resolution]
+        if since_ms is not None:
+            floor = max(floor, since_ms)
+        keep = ts >= floor
+        return ts[keep], mean[keep], peak[keep]
+
+    def best_resolution(self):
+        # Finest level that still holds the whole session
+        with self._lock:
+            raw = self._rings['raw']
+            if self.first_ts is None:
+                return 'raw'
+            span = raw.ts[(raw.head - 1) % raw.capacity] - self.first_ts
+            for resolution in RESOLUTIONS:
+                if not self._rings[resolution].wrapped and span <= self._retention[resolution]:
+                    return resolution
+        return 'minute'
+
+    def as_history(self, resolution=None):
+        # {zone: [count, ...]} and ISO timestamps, the shape visualization.py charts take
+        resolution = resolution or self.best_resolution()
+        ts, mean, _ = self.series(resolution)
+        values = mean if resolution != 'raw' else mean.astype(np.int32)
+        history = {name: np.round(values[:, i], 2).tolist() for i, name in enumerate(self.names)}
+        return history, [iso(t) for t in ts.tolist()]
+
+    def rollup(self, resolution='minute', since_ms=None):
+        ts, mean, peak = self.series(resolution, since_ms)
+        return [{'ts': iso(t), **{name: {'mean': round(float(mean[row, i]), 2), 'max': int(peak[row, i])}
+                                  for i, name in enumerate(self.names)}}
+                for row, t in enumerate(ts.tolist())]
+
+    def nbytes(self):
+        return sum(r.ts.nbytes + r.mean.nbytes + r.max.nbytes for r in self._rings.values())
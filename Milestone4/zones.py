@@ -0,0 +1,206 @@
+import json
+import os
+import threading
+import time
+
+import cv2
+import numpy as np
+
+ZONES_DIR = 'zones'            # optional per-camera layouts: zones/<camera>.json, zones/default.json
+RELOAD_INTERVAL = 1.0          # seconds between layout file mtime checks
+
+# Built-in layouts, matching the original hard-coded zones. Points are in `size` pixel coordinates and are
+# rescaled to the actual frame. Anything outside every polygon belongs to the `outside` zone.
+BUILTIN_LAYOUTS = {
+    'video': {
+        'size': [1024, 576],
+        'outside': 'Zone 2',
+        'outside_color': [255, 0, 255],
+        'zones': [
+            {'name': 'Zone 1', 'points': [[700, 0], [1024, 0], [1024, 576], [700, 576]],
+             'color': [0, 255, 255], 'threshold': 10},
+        ],
+    },
+    'image': {
+        'size': [1024, 576],
+        'outside': 'Zone 2',
+        'outside_color': [0, 165, 255],
+        'zones': [
+            {'name': 'Zone 1', 'points': [[0, 0], [341, 0], [341, 576], [0, 576]], 'color': [0, 255, 0]},
+        ],
+    },
+}
+
+
+class ZoneLayout:
+    # Named polygon zones rasterised once into an integer label mask (0 = outside, i = i-th polygon;
+    # later polygons win where they overlap). Assigning N box centres is then one NumPy gather, and
+    # per-zone counts are one bincount, no matter how many zones there are.
+
+    def __init__(self, spec, frame_size=None):
+        self.spec = spec
+        ref_w, ref_h = spec.get('size', [1024, 576])
+        self.width, self.height = frame_size or (ref_w, ref_h)
+        self.zones = spec['zones']
+        self.names = [spec.get('outside', 'Outside')] + [z['name'] for z in self.zones]
+        self.colors = [tuple(spec.get('outside_color', [255, 0, 255]))] + \
+                      [tuple(z.get('color', [0, 255, 255])) for z in self.zones]
+        self.thresholds = [None] + [z.get('threshold') for z in self.zones]
+        self._sized = {}
+
+        scale = np.array([self.width / ref_w, self.height / ref_h])
+        self.polygons = [np.round(np.array(z['points'], dtype=np.float64) * scale).astype(np.int32)
+                         for z in self.zones]
+        self.mask = np.zeros((self.height, self.width), dtype=np.int32)
+        for label, polygon in enumerate(self.polygons, 1):
+            cv2.fillPoly(self.mask, [polygon], label)
+
+    def for_size(self, width, height):
+        # Rescaled copies are rasterised once per frame size and kept
+        if (width, height) == (self.width, self.height):
+            return self
+        sized = self._sized.get((width, height))
+        if sized is None:
+            if len(self._sized) >= 8:
+                self._sized.clear()
+            sized = self._sized[(width, height)] = ZoneLayout(self.spec, (width, height))
+        return sized
+
+    def centers(self, boxes):
+        boxes = np.asarray(boxes, dtype=np.int64).reshape(-1, 4)
+        return np.stack([(boxes[:, 0] + boxes[:, 2]) // 2, (boxes[:, 1] + boxes[:, 3]) // 2], axis=1)
+
+    def assign(self, centers):
+        centers = np.asarray(centers, dtype=np.int64).reshape(-1, 2)
+        xs = np.clip(centers[:, 0], 0, self.width - 1)
+        ys = np.clip(centers[:, 1], 0, self.height - 1)
+        return self.mask[ys, xs]
+
+    def count_labels(self, labels):
+        return np.bincount(labels, minlength=len(self.names))
+
+    def counts(self, labels):
+        # Zone name -> people count, polygons first (in layout order), outside last
+        totals = self.count_labels(labels)
+        return {name: int(totals[label]) for label, name in self.display_order()}
+
+    def series(self, frame_of_box, labels, frames):
+        # Per-frame counts for every zone from flat (frame index, label) columns, in one bincount
+        width = len(self.names)
+        grid = np.bincount(np.asarray(frame_of_box, dtype=np.int64) * width + labels,
+                           minlength=frames * width).reshape(frames, width)
+        return {name: grid[:, label].tolist() for label, name in self.display_order()}
+
+    def display_order(self):
+        return [(label, self.names[label]) for label in list(range(1, len(self.names))) + [0]]
+
+    def draw(self, frame, color=(0, 0, 255), thickness=3):
+        if self.polygons:
+            cv2.polylines(frame, self.polygons, True, color, thickness)
+
+    def signature(self):
+        return json.dumps(self.spec, sort_keys=True)
+
+
+_layouts = {}      # camera -> (ZoneLayout, path, mtime, last check time)
+_layouts_lock = threading.Lock()
+
+
+def camera_key(source):
+    # 'webcam' stays as is; a video path maps to its file name without extension
+    return source if source == 'webcam' else os.path.splitext(os.path.basename(str(source)))[0]
+
+
+def _layout_file(camera):
+    for name in (camera, 'default'):
+        path = os.path.join(ZONES_DIR, f'{name}.json')
+        if os.path.exists(path):
+            return path
+    return None
+
+
+def get_layout(source, kind='video'):
+    # Cheap enough to call every frame: the layout file is re-checked at most once per RELOAD_INTERVAL,
+    # so editing zones/<camera>.json takes effect on a running stream without restarting it
+    camera = camera_key(source)
+    now = time.monotonic()
+    with _layouts_lock:
+        cached = _layouts.get((camera, kind))
+        if cached is not None and now - cached[3] < RELOAD_INTERVAL:
+            return cached[0]
+        path = _layout_file(camera) if kind == 'video' else None
+        mtime = os.path.getmtime(path) if path else None
+        if cached is not None and cached[1] == path and cached[2] == mtime:
+            _layouts[(camera, kind)] = (cached[0], path, mtime, now)
+            return cached[0]
+        layout = cached[0] if cached is not None else None
+        try:
+            if path:
+                with open(path) as f:
+                    layout = ZoneLayout(validate(json.load(f)))
+            else:
+                layout = ZoneLayout(BUILTIN_LAYOUTS[kind])
+        except (OSError, ValueError, KeyError):
+            # A half-written or invalid file keeps the previous layout running
+            if layout is None:
+                layout = ZoneLayout(BUILTIN_LAYOUTS[kind])
+        _layouts[(camera, kind)] = (layout, path, mtime, now)
+        return layout
+
+
+def _is_number(value):
+    return isinstance(value, (int, float)) and not isinstance(value, bool)
+
+
+def _is_color(value):
+    # BGR, as cv2 draws it
+    return (isinstance(value, (list, tuple)) and len(value) == 3
+            and all(isinstance(v, int) and not isinstance(v, bool) and 0 <= v <= 255 for v in value))
+
+
+def validate(spec):
+    # Also run on every reloaded zones/*.json: a layout that passes is safe to draw and count with
+    if not isinstance(spec, dict) or not isinstance(spec.get('zones'), list):
+        raise ValueError("Zone layout needs a 'zones' list.")
+    size = spec.setdefault('size', [1024, 576])
+    if (not isinstance(size, (list, tuple)) or len(size) != 2
+            or not all(isinstance(v, (int, float)) for v in size) or min(size) <= 0):
+        raise ValueError("Zone layout 'size' must be [width, height].")
+    outside = spec.get('outside', 'Outside')
+    if not isinstance(outside, str) or not outside:
+        raise ValueError("Zone layout 'outside' must be a zone name.")
+    if 'outside_color' in spec and not _is_color(spec['outside_color']):
+        raise ValueError("Zone layout 'outside_color' must be [b, g, r] integers in 0..255.")
+    names = set()
+    for zone in spec['zones']:
+        if not isinstance(zone, dict) or not isinstance(zone.get('name'), str) or not zone['name'] or zone['name'] in names:
+            raise ValueError("Every zone needs a unique 'name'.")
+        points = zone.get('points', [])
+        if not isinstance(points, (list, tuple)) or len(points) < 3:
+            raise ValueError(f"Zone '{zone['name']}' needs at least 3 points.")
+        if not all(isinstance(p, (list, tuple)) and len(p) == 2 and all(isinstance(v, (int, float)) for v in p)
+                   for p in points):
+            raise ValueError(f"Zone '{zone['name']}' points must be [x, y] pairs.")
+        if 'color' in zone and not _is_color(zone['color']):
+            raise ValueError(f"Zone '{zone['name']}' color must be [b, g, r] integers in 0..255.")
+        threshold = zone.get('threshold')
+        if threshold is not None and (not _is_number(threshold) or threshold < 0):
+            raise ValueError(f"Zone '{zone['name']}' threshold must be a non-negative number or null.")
+        names.add(zone['name'])
+    if outside in names:
+        raise ValueError(f"Zone layout 'outside' name '{outside}' is also a polygon zone name.")
+    return spec
+
+
+def save_layout(source, spec):
+    camera = camera_key(source)
+    spec = validate(spec)
+    os.makedirs(ZONES_DIR, exist_ok=True)
+    path = os.path.join(ZONES_DIR, f'{camera}.json')
+    tmp = path + '.tmp'
+    with open(tmp, 'w') as f:
+        json.dump(spec, f, indent=2)
+    os.replace(tmp, path)
+    with _layouts_lock:
+        _layouts.pop((camera, 'video'), None)
+    return path